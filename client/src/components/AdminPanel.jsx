@@ -1,6 +1,6 @@
 import { useState, useEffect } from 'react';
 import { Settings, RefreshCw, Check, Link as LinkIcon, Music, ListMusic, Download, ArrowLeft, ExternalLink, Loader, Youtube } from 'lucide-react';
-import { spotifyAPI, youtubeAPI } from '../services/api';
+import { spotifyAPI, youtubeAPI, importsAPI } from '../services/api';
 import './AdminPanel.css';
 
 const AdminPanel = ({ onBack, onUpdateLibrary }) => {
@@ -52,11 +52,23 @@ const AdminPanel = ({ onBack, onUpdateLibrary }) => {
         alert("Spotify OAuth is currently disabled due to developer portal restrictions. Please use the Direct Import via URL below.");
     };
 
+    // Imports run as server-side jobs; follow one until it completes
+    const followImport = async (job, label) => {
+        const done = await importsAPI.waitFor(job.job_id, (j) => {
+            setMessage(`${label}... ${j.processed}/${j.total}`);
+        });
+        if (done.status !== 'completed') {
+            throw new Error(done.error || `Import ${done.status}`);
+        }
+        return done;
+    };
+
     const handleImportPlaylist = async (playlist) => {
         setImportingId(playlist.id);
         setMessage(`Importing ${playlist.name}...`);
         try {
-            const result = await spotifyAPI.importPlaylist(playlist.id, playlist.name);
+            const job = await spotifyAPI.importPlaylist(playlist.id, playlist.name);
+            const result = await followImport(job, `Importing ${playlist.name}`);
             setMessage(`Successfully imported ${result.imported_count} tracks!`);
             if (onUpdateLibrary) onUpdateLibrary();
             setTimeout(() => setMessage(''), 3000);
@@ -79,7 +91,8 @@ const AdminPanel = ({ onBack, onUpdateLibrary }) => {
         setImportingId('direct');
         setMessage(`Importing playlist from URL...`);
         try {
-            const result = await spotifyAPI.importPlaylistByUrl(directUrl, directName);
+            const job = await spotifyAPI.importPlaylistByUrl(directUrl, directName);
+            const result = await followImport(job, 'Importing playlist from URL');
             setMessage(`Successfully imported ${result.imported_count} tracks!`);
             setDirectUrl('');
             setDirectName('');
@@ -104,7 +117,10 @@ const AdminPanel = ({ onBack, onUpdateLibrary }) => {
         setImportingId('youtube');
         setMessage(`Importing YouTube playlist...`);
         try {
-            const result = await youtubeAPI.importPlaylistByUrl(ytUrl, ytName);
+            const job = await youtubeAPI.importPlaylistByUrl(ytUrl, ytName);
+            // The playlist exists right away and fills in page by page
+            if (onUpdateLibrary) onUpdateLibrary();
+            const result = await followImport(job, 'Importing YouTube playlist');
             setMessage(`Successfully imported ${result.imported_count} tracks from YouTube!`);
             setYtUrl('');
             setYtName('');
@@ -122,7 +138,8 @@ const AdminPanel = ({ onBack, onUpdateLibrary }) => {
         setImportingId('liked');
         setMessage('Importing your Liked Songs...');
         try {
-            const result = await spotifyAPI.importLiked();
+            const job = await spotifyAPI.importLiked();
+            const result = await followImport(job, 'Importing your Liked Songs');
             setMessage(`Successfully imported ${result.imported_count} liked songs!`);
             if (onUpdateLibrary) onUpdateLibrary();
             setTimeout(() => setMessage(''), 3000);
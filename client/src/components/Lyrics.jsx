@@ -8,29 +8,14 @@ const Lyrics = ({ lyrics, currentTime, isOpen, onClose }) => {
     const scrollRef = useRef(null);
     const activeLineRef = useRef(null);
 
-    // Parse LRC format
+    // Lines arrive pre-parsed from the server as [[ms, text], ...]
     useEffect(() => {
         if (!lyrics) {
             setParsedLyrics([]);
             return;
         }
 
-        const lines = lyrics.split('\n');
-        const parsed = lines
-            .map(line => {
-                const match = line.match(/\[(\d{2}):(\d{2})\.(\d{2,3})\](.*)/);
-                if (match) {
-                    const minutes = parseInt(match[1]);
-                    const seconds = parseInt(match[2]);
-                    const milliseconds = parseInt(match[3]);
-                    const time = minutes * 60 + seconds + milliseconds / 1000;
-                    return { time, text: match[4].trim() };
-                }
-                return null;
-            })
-            .filter(line => line !== null && line.text.length > 0);
-
-        setParsedLyrics(parsed);
+        setParsedLyrics(lyrics.map(([ms, text]) => ({ time: ms / 1000, text })));
     }, [lyrics]);
 
     // Auto-scroll to active line
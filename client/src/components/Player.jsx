@@ -2,7 +2,7 @@ import { useState, useRef, useEffect } from 'react';
 import { Play, Pause, SkipBack, SkipForward, Volume2, VolumeX, ChevronDown, Heart, ListPlus, Shuffle, Mic2, List } from 'lucide-react';
 import { useConfig } from '../contexts/ConfigContext';
 import { useAuth } from '../contexts/AuthContext';
-import { likedAPI, streamAPI, lyricsAPI } from '../services/api';
+import { likedAPI, streamAPI, lyricsAPI, prefetchAPI } from '../services/api';
 import PlaylistPicker from './PlaylistPicker';
 import Lyrics from './Lyrics';
 import Queue from './Queue';
@@ -76,6 +76,16 @@ const Player = ({ currentTrack, onNext, onPrev, onLibraryUpdate, isShuffle, onTo
         }
     }, [currentTrack, isAuthenticated]);
 
+    // Warm the server for the next tracks so skipping ahead starts instantly
+    useEffect(() => {
+        if (!isAuthenticated || !currentTrack || !queue || queue.length === 0) return;
+        const index = queue.findIndex(t => t.id === currentTrack.id);
+        const upcoming = queue.slice(index + 1, index + 3);
+        if (upcoming.length > 0) {
+            prefetchAPI.prefetch(upcoming).catch(() => {});
+        }
+    }, [currentTrack, queue, isAuthenticated]);
+
     // Load and play track when currentTrack changes
     useEffect(() => {
         if (!currentTrack || !audioRef.current) return;
@@ -97,8 +107,8 @@ const Player = ({ currentTrack, onNext, onPrev, onLibraryUpdate, isShuffle, onTo
 
             try {
                 // Fetch Lyrics in background
-                lyricsAPI.get(`${currentTrack.title} ${currentTrack.uploader}`)
-                    .then(data => setLyrics(data.lyrics))
+                lyricsAPI.getLines(`${currentTrack.title} ${currentTrack.uploader}`)
+                    .then(data => setLyrics(data.synced ? data.lines : null))
                     .catch(err => console.error("Failed to fetch lyrics", err));
 
                 const streamData = await streamAPI.getStream(currentTrack.id);
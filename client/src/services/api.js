@@ -40,14 +40,23 @@ export const authAPI = {
 // ============== Search ==============
 
 export const searchAPI = {
-    search: async (query, page = 1) => {
-        const res = await api.get('/search', { params: { query, page } });
+    // source: 'youtube' (default), 'local' for the server's track catalog, or 'hybrid'
+    search: async (query, page = 1, source) => {
+        const res = await api.get('/search', { params: { query, page, source } });
         return res.data;
     }
 };
 
 // ============== Liked Songs ==============
 
+const toTrackData = (track) => ({
+    video_id: track.id,
+    title: track.title,
+    uploader: track.uploader,
+    thumbnail: track.thumbnail,
+    duration: track.duration
+});
+
 export const likedAPI = {
     getAll: async () => {
         const res = await api.get('/liked');
@@ -73,6 +82,22 @@ export const likedAPI = {
     remove: async (videoId) => {
         const res = await api.delete(`/liked/${videoId}`);
         return res.data;
+    },
+
+    // Returns { videoId: bool } for every id in one request
+    checkMany: async (videoIds) => {
+        const res = await api.post('/liked/check', { video_ids: videoIds });
+        return res.data.liked;
+    },
+
+    addMany: async (tracks) => {
+        const res = await api.post('/liked/batch', { tracks: tracks.map(toTrackData) });
+        return res.data;
+    },
+
+    removeMany: async (videoIds) => {
+        const res = await api.post('/liked/batch/remove', { video_ids: videoIds });
+        return res.data;
     }
 };
 
@@ -118,6 +143,22 @@ export const playlistAPI = {
     removeTrack: async (playlistId, videoId) => {
         const res = await api.delete(`/playlists/${playlistId}/tracks/${videoId}`);
         return res.data;
+    },
+
+    addTracks: async (playlistId, tracks) => {
+        const res = await api.post(`/playlists/${playlistId}/tracks/batch`, { tracks: tracks.map(toTrackData) });
+        return res.data;
+    },
+
+    removeTracks: async (playlistId, videoIds) => {
+        const res = await api.post(`/playlists/${playlistId}/tracks/batch/remove`, { video_ids: videoIds });
+        return res.data;
+    },
+
+    // videoIds in their new order; tracks left out keep their order after them
+    reorder: async (playlistId, videoIds) => {
+        const res = await api.put(`/playlists/${playlistId}/tracks/order`, { video_ids: videoIds });
+        return res.data;
     }
 };
 
@@ -170,6 +211,30 @@ export const spotifyAPI = {
     }
 };
 
+// ============== Import Jobs ==============
+
+export const importsAPI = {
+    get: async (jobId) => {
+        const res = await api.get(`/imports/${jobId}`);
+        return res.data;
+    },
+
+    cancel: async (jobId) => {
+        const res = await api.post(`/imports/${jobId}/cancel`);
+        return res.data;
+    },
+
+    // Poll a background import until it finishes, reporting progress along the way
+    waitFor: async (jobId, onProgress, interval = 1500) => {
+        for (;;) {
+            const job = await importsAPI.get(jobId);
+            if (onProgress) onProgress(job);
+            if (['completed', 'failed', 'cancelled'].includes(job.status)) return job;
+            await new Promise(resolve => setTimeout(resolve, interval));
+        }
+    }
+};
+
 export const youtubeAPI = {
     importPlaylistByUrl: async (url, name) => {
         const res = await api.post('/youtube/import/url', { url, name });
@@ -186,10 +251,26 @@ export const streamAPI = {
     }
 };
 
+export const prefetchAPI = {
+    // Ask the server to warm stream/lyrics/audio for upcoming tracks
+    prefetch: async (tracks) => {
+        const res = await api.post('/prefetch', {
+            tracks: tracks.map(t => ({ video_id: t.id, title: t.title, uploader: t.uploader }))
+        });
+        return res.data;
+    }
+};
+
 export const lyricsAPI = {
     get: async (query) => {
         const res = await api.get('/lyrics', { params: { query } });
         return res.data;
+    },
+
+    // Server-parsed lyrics: { synced, start, lines: [[ms, text], ...] }
+    getLines: async (query) => {
+        const res = await api.get('/lyrics/lines', { params: { query } });
+        return res.data;
     }
 };
 
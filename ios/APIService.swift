@@ -108,6 +108,13 @@ class APIService {
         let _: JSONValue = try await fetch(endpoint: "/liked/\(videoId)", method: "DELETE")
     }
     
+    /// Liked status for many tracks in one request
+    func checkLiked(videoIds: [String]) async throws -> [String: Bool] {
+        let body = try JSONEncoder().encode(["video_ids": videoIds])
+        let res: LikedCheckResponse = try await fetch(endpoint: "/liked/check", method: "POST", body: body)
+        return res.liked
+    }
+    
     // MARK: - Playlists
     func getPlaylists() async throws -> [Playlist] {
         let res: PlaylistsResponse = try await fetch(endpoint: "/playlists")
@@ -128,6 +135,11 @@ class APIService {
         let _: JSONValue = try await fetch(endpoint: "/playlists/\(id)/tracks", method: "POST", body: body)
     }
     
+    func reorderPlaylist(id: Int, videoIds: [String]) async throws {
+        let body = try JSONEncoder().encode(["video_ids": videoIds])
+        let _: JSONValue = try await fetch(endpoint: "/playlists/\(id)/tracks/order", method: "PUT", body: body)
+    }
+    
     // MARK: - Import
     func importSpotifyPlaylist(id: String, name: String) async throws {
         let body = try JSONEncoder().encode(["spotify_id": id, "name": name])
@@ -36,6 +36,10 @@ struct LikedSongsResponse: Codable {
     let tracks: [Track]
 }
 
+struct LikedCheckResponse: Codable {
+    let liked: [String: Bool]
+}
+
 struct PlaylistDetail: Codable {
     let id: Int
     let name: String
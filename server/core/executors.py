@@ -0,0 +1,127 @@
+import asyncio
+import itertools
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable
+from core.config import CONFIG
+
+# Lower runs first within a pool
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BATCH = 10
+
+
+class WorkloadPool:
+    """
+    Fixed-size thread pool fed from a priority queue.
+    Each workload gets its own pool so batch work cannot starve play-start,
+    and within a pool interactive calls jump ahead of queued batch calls.
+    """
+
+    def __init__(self, name: str, workers: int):
+        self.name = name
+        self.workers = workers
+        self._queue = queue.PriorityQueue()
+        self._seq = itertools.count()
+        self._threads = []
+        self._lock = threading.Lock()
+        self._shutdown = False
+
+        self.active = 0
+        self.completed = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def _ensure_started(self):
+        if self._threads:
+            return
+        with self._lock:
+            if self._threads:
+                return
+            for i in range(self.workers):
+                t = threading.Thread(target=self._worker, name=f"{self.name}-{i}", daemon=True)
+                t.start()
+                self._threads.append(t)
+
+    def submit(self, fn: Callable, *args, priority: int = PRIORITY_INTERACTIVE) -> Future:
+        if self._shutdown:
+            raise RuntimeError(f"Executor '{self.name}' is shut down")
+        self._ensure_started()
+        future = Future()
+        self._queue.put((priority, next(self._seq), time.monotonic(), fn, args, future))
+        return future
+
+    async def run(self, fn: Callable, *args, priority: int = PRIORITY_INTERACTIVE):
+        return await asyncio.wrap_future(self.submit(fn, *args, priority=priority))
+
+    def promote(self, future: Future, fn: Callable, *args, priority: int = PRIORITY_INTERACTIVE):
+        """
+        Queue a not-yet-started call again at a better priority. Whichever
+        queue entry a worker reaches first runs it; the other is skipped.
+        """
+        if future.done() or future.running():
+            return
+        self._queue.put((priority, next(self._seq), time.monotonic(), fn, args, future))
+
+    def _worker(self):
+        while True:
+            priority, _, enqueued, fn, args, future = self._queue.get()
+            if fn is None:
+                return
+            # A promoted call has two queue entries; only the first one reached runs
+            with self._lock:
+                if future.done() or future.running():
+                    continue
+                if not future.set_running_or_notify_cancel():
+                    continue
+
+            wait = time.monotonic() - enqueued
+            with self._lock:
+                self.active += 1
+                self.total_wait += wait
+                self.max_wait = max(self.max_wait, wait)
+            try:
+                future.set_result(fn(*args))
+            except BaseException as e:
+                future.set_exception(e)
+            finally:
+                with self._lock:
+                    self.active -= 1
+                    self.completed += 1
+
+    def shutdown(self):
+        self._shutdown = True
+        for _ in self._threads:
+            # Sorts after any real work so queued calls still drain
+            self._queue.put((float("inf"), next(self._seq), 0.0, None, (), None))
+
+    def stats(self) -> dict:
+        with self._lock:
+            started = self.completed + self.active
+            return {
+                "workers": self.workers,
+                "active": self.active,
+                "queued": self._queue.qsize(),
+                "completed": self.completed,
+                "avg_wait_ms": round(self.total_wait / started * 1000, 2) if started else 0.0,
+                "max_wait_ms": round(self.max_wait * 1000, 2)
+            }
+
+
+stream_pool = WorkloadPool("stream", CONFIG.executors.stream_workers)
+search_pool = WorkloadPool("search", CONFIG.executors.search_workers)
+lyrics_pool = WorkloadPool("lyrics", CONFIG.executors.lyrics_workers)
+import_pool = WorkloadPool("imports", CONFIG.executors.import_workers)
+cache_pool = WorkloadPool("audio_cache", CONFIG.executors.audio_cache_workers)
+
+POOLS = [stream_pool, search_pool, lyrics_pool, import_pool, cache_pool]
+
+
+def executor_stats() -> dict:
+    return {pool.name: pool.stats() for pool in POOLS}
+
+
+def shutdown_executors():
+    for pool in POOLS:
+        pool.shutdown()
@@ -0,0 +1,198 @@
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Dict, List, Optional
+from core.config import CONFIG
+
+SERVER_DIR = Path(__file__).resolve().parent.parent
+# Identifies this process to the other workers sharing cache.db and the database
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+
+
+class MetadataStore:
+    """
+    SQLite-backed cache for extraction results that should survive restarts:
+    unexpired stream URLs, search pages, lyrics and the player JS.
+    Video metadata lives in the tracks catalog in mobify.db.
+    Lives in its own file so it can be deleted without touching mobify.db.
+    Every worker process opens the same file, which makes it the shared cache tier.
+    """
+
+    def __init__(self):
+        path = Path(CONFIG.metadata_cache.path)
+        self.path = path if path.is_absolute() else SERVER_DIR / path
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(str(self.path), check_same_thread=False, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        # Other workers hold the write lock briefly; wait instead of failing
+        self.conn.execute("PRAGMA busy_timeout=5000")
+        self._create_tables()
+
+    def _create_tables(self):
+        with self.lock:
+            self.conn.executescript("""
+                CREATE TABLE IF NOT EXISTS stream_urls (
+                    video_id TEXT PRIMARY KEY,
+                    data TEXT NOT NULL,
+                    expires_at REAL NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS search_results (
+                    key TEXT PRIMARY KEY,
+                    results TEXT NOT NULL,
+                    expires_at REAL NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS lyrics (
+                    key TEXT PRIMARY KEY,
+                    lrc TEXT,
+                    lines TEXT,
+                    fetched_at REAL NOT NULL,
+                    expires_at REAL
+                );
+                CREATE TABLE IF NOT EXISTS kv (
+                    key TEXT PRIMARY KEY,
+                    value TEXT,
+                    updated_at REAL
+                );
+                CREATE TABLE IF NOT EXISTS leases (
+                    key TEXT PRIMARY KEY,
+                    owner TEXT NOT NULL,
+                    expires_at REAL NOT NULL
+                );
+            """)
+            # Video metadata moved to the tracks catalog
+            self.conn.execute("DROP TABLE IF EXISTS videos")
+            # Columns added after the first release of a table
+            columns = {row[1] for row in self.conn.execute("PRAGMA table_info(lyrics)")}
+            if "lines" not in columns:
+                self.conn.execute("ALTER TABLE lyrics ADD COLUMN lines TEXT")
+
+    def purge_expired(self):
+        now = time.time()
+        with self.lock:
+            self.conn.execute("DELETE FROM stream_urls WHERE expires_at <= ?", (now,))
+            self.conn.execute("DELETE FROM search_results WHERE expires_at <= ?", (now,))
+            self.conn.execute("DELETE FROM lyrics WHERE expires_at <= ?", (now,))
+            self.conn.execute("DELETE FROM leases WHERE expires_at <= ?", (now,))
+
+    # ---------- Stream URLs ----------
+
+    def put_stream(self, video_id: str, data: Dict, expires_at: float):
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO stream_urls (video_id, data, expires_at) VALUES (?, ?, ?)",
+                (video_id, json.dumps(data), expires_at)
+            )
+
+    def get_stream(self, video_id: str) -> Optional[tuple]:
+        """(data, expires_at) for an unexpired stream URL."""
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT data, expires_at FROM stream_urls WHERE video_id = ? AND expires_at > ?",
+                (video_id, time.time())
+            ).fetchone()
+        return (json.loads(row[0]), row[1]) if row else None
+
+    def delete_stream(self, video_id: str):
+        with self.lock:
+            self.conn.execute("DELETE FROM stream_urls WHERE video_id = ?", (video_id,))
+
+    def iter_streams(self):
+        """(video_id, data, expires_at) for every unexpired stream URL."""
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT video_id, data, expires_at FROM stream_urls WHERE expires_at > ? ORDER BY expires_at",
+                (time.time(),)
+            ).fetchall()
+        return [(video_id, json.loads(data), expires_at) for video_id, data, expires_at in rows]
+
+    # ---------- Search ----------
+
+    def put_search(self, key: str, results: List[Dict], ttl: float):
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO search_results (key, results, expires_at) VALUES (?, ?, ?)",
+                (key, json.dumps(results), time.time() + ttl)
+            )
+
+    def get_search(self, key: str) -> Optional[List[Dict]]:
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT results FROM search_results WHERE key = ? AND expires_at > ?",
+                (key, time.time())
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    # ---------- Lyrics ----------
+
+    def put_lyrics(self, key: str, lrc: Optional[str], lines: Optional[list], ttl: Optional[float] = None):
+        """Store lyrics and their parsed lines, or a miss (lrc=None); ttl=None keeps the entry forever."""
+        now = time.time()
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO lyrics (key, lrc, lines, fetched_at, expires_at) VALUES (?, ?, ?, ?, ?)",
+                (key, lrc, json.dumps(lines) if lines is not None else None, now, now + ttl if ttl is not None else None)
+            )
+
+    def get_lyrics(self, key: str) -> Optional[tuple]:
+        """
+        (lrc, lines) for a cached entry, where lrc is None for a remembered miss
+        and lines is None if never parsed; None if the key is unknown.
+        """
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT lrc, lines FROM lyrics WHERE key = ? AND (expires_at IS NULL OR expires_at > ?)",
+                (key, time.time())
+            ).fetchone()
+        if not row:
+            return None
+        return row[0], json.loads(row[1]) if row[1] is not None else None
+
+    # ---------- Key/value ----------
+
+    def put_value(self, key: str, value: str):
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO kv (key, value, updated_at) VALUES (?, ?, ?)",
+                (key, value, time.time())
+            )
+
+    def get_value(self, key: str) -> Optional[str]:
+        with self.lock:
+            row = self.conn.execute("SELECT value FROM kv WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    # ---------- Leases ----------
+
+    def acquire_lease(self, key: str, ttl: float) -> bool:
+        """
+        Claim `key` for this worker for `ttl` seconds. Fails while another
+        worker holds an unexpired lease, so only one process does the work.
+        """
+        now = time.time()
+        with self.lock:
+            cursor = self.conn.execute("""
+                INSERT INTO leases (key, owner, expires_at) VALUES (?, ?, ?)
+                ON CONFLICT(key) DO UPDATE SET owner = excluded.owner, expires_at = excluded.expires_at
+                WHERE leases.expires_at <= ? OR leases.owner = excluded.owner
+            """, (key, WORKER_ID, now + ttl, now))
+        return cursor.rowcount > 0
+
+    def release_lease(self, key: str):
+        with self.lock:
+            self.conn.execute("DELETE FROM leases WHERE key = ? AND owner = ?", (key, WORKER_ID))
+
+    def stats(self) -> dict:
+        with self.lock:
+            counts = {
+                table: self.conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+                for table in ("stream_urls", "search_results", "lyrics")
+            }
+        return {"path": str(self.path), **counts}
+
+metadata_store = MetadataStore()
@@ -1,15 +1,80 @@
-from sqlalchemy import create_engine, Column, Integer, String, DateTime, ForeignKey, Text
+from sqlalchemy import create_engine, event, case, func, Boolean, Column, Integer, String, DateTime, ForeignKey, Text, Index, inspect, text
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker, relationship
+from sqlalchemy.orm import sessionmaker, relationship, Session
+from typing import Dict, List
 from datetime import datetime
 import os
+import time
+from core.config import CONFIG
 
-# Database location
+DB_CONFIG = CONFIG.database
+
+# Database location: config URL, or the local SQLite file
 DB_PATH = os.path.join(os.path.dirname(__file__), "mobify.db")
-DATABASE_URL = f"sqlite:///{DB_PATH}"
+DATABASE_URL = make_url(DB_CONFIG.url or f"sqlite:///{DB_PATH}")
+IS_SQLITE = DATABASE_URL.get_backend_name() == "sqlite"
+
+# Async driver for each supported backend
+ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+}
+if DATABASE_URL.get_backend_name() not in ASYNC_DRIVERS:
+    raise ValueError(
+        f"Unsupported database backend '{DATABASE_URL.get_backend_name()}' in database.url; "
+        f"use one of: {', '.join(ASYNC_DRIVERS)}"
+    )
+ASYNC_DATABASE_URL = DATABASE_URL.set(drivername=ASYNC_DRIVERS[DATABASE_URL.get_backend_name()])
+
+# Dialect INSERT constructs, for ON CONFLICT support
+DIALECT_INSERTS = {
+    "sqlite": sqlite.insert,
+    "postgresql": postgresql.insert,
+}
+
+POOL_OPTIONS = {
+    "pool_size": DB_CONFIG.pool_size,
+    "max_overflow": DB_CONFIG.max_overflow,
+    "pool_timeout": DB_CONFIG.pool_timeout,
+}
+
+engine = create_engine(
+    DATABASE_URL,
+    connect_args={"check_same_thread": False} if IS_SQLITE else {},
+    **POOL_OPTIONS
+)
+async_engine = create_async_engine(ASYNC_DATABASE_URL, **POOL_OPTIONS)
+
+# PRAGMA name -> configured value, applied in this order on every new connection.
+# busy_timeout goes first so switching journal_mode waits out other workers' locks.
+SQLITE_PRAGMAS = {
+    "busy_timeout": DB_CONFIG.busy_timeout,
+    "journal_mode": DB_CONFIG.journal_mode,
+    "synchronous": DB_CONFIG.synchronous,
+    "cache_size": DB_CONFIG.cache_size,
+    "mmap_size": DB_CONFIG.mmap_size,
+}
+
+
+def _apply_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    try:
+        for name, value in SQLITE_PRAGMAS.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+    finally:
+        cursor.close()
+
+if IS_SQLITE:
+    event.listen(engine, "connect", _apply_sqlite_pragmas)
+    event.listen(async_engine.sync_engine, "connect", _apply_sqlite_pragmas)
 
-engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# Objects stay readable after commit, so async code never triggers an implicit lazy load
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
 Base = declarative_base()
 
 
@@ -30,19 +95,41 @@ class User(Base):
     playlists = relationship("Playlist", back_populates="user", cascade="all, delete-orphan")
 
 
-class LikedSong(Base):
-    __tablename__ = "liked_songs"
+# Metadata columns that live only in the tracks catalog
+TRACK_FIELDS = ("title", "uploader", "thumbnail", "duration")
+
+
+class Track(Base):
+    """Catalog of every YouTube video the app knows about, one row per video_id."""
+    __tablename__ = "tracks"
     
-    id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
-    video_id = Column(String(50), nullable=False)
+    video_id = Column(String(50), primary_key=True)
     title = Column(String(500))
     uploader = Column(String(255))
     thumbnail = Column(Text)
     duration = Column(Integer)
+    # Upstream audio size and type, for answering range requests before the stream is opened
+    filesize = Column(Integer)
+    mime_type = Column(String(100))
+    # Whether the metadata came from YouTube rather than from a client's request
+    verified = Column(Boolean, default=False)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+
+class LikedSong(Base):
+    __tablename__ = "liked_songs"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    video_id = Column(String(50), ForeignKey("tracks.video_id"), nullable=False)
     added_at = Column(DateTime, default=datetime.utcnow)
     
     user = relationship("User", back_populates="liked_songs")
+    track = relationship("Track", lazy="joined", innerjoin=True)
+    
+    __table_args__ = (
+        Index("ux_liked_songs_user_video", "user_id", "video_id", unique=True),
+    )
 
 
 class Playlist(Base):
@@ -62,15 +149,52 @@ class PlaylistTrack(Base):
     
     id = Column(Integer, primary_key=True, index=True)
     playlist_id = Column(Integer, ForeignKey("playlists.id"), nullable=False)
-    video_id = Column(String(50), nullable=False)
-    title = Column(String(500))
-    uploader = Column(String(255))
-    thumbnail = Column(Text)
-    duration = Column(Integer)
+    video_id = Column(String(50), ForeignKey("tracks.video_id"), nullable=False)
     position = Column(Integer, default=0)
     added_at = Column(DateTime, default=datetime.utcnow)
     
     playlist = relationship("Playlist", back_populates="tracks")
+    track = relationship("Track", lazy="joined", innerjoin=True)
+    
+    __table_args__ = (
+        Index("ux_playlist_tracks_playlist_video", "playlist_id", "video_id", unique=True),
+        Index("ix_playlist_tracks_playlist_position", "playlist_id", "position"),
+    )
+
+
+class ImportJob(Base):
+    __tablename__ = "import_jobs"
+    
+    id = Column(String(32), primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    kind = Column(String(32), nullable=False)
+    name = Column(String(255))
+    status = Column(String(20), nullable=False, default="queued")
+    playlist_id = Column(Integer, ForeignKey("playlists.id", ondelete="SET NULL"), nullable=True)
+    # JSON list of source tracks; matching resumes from `processed`
+    source = Column(Text, nullable=False)
+    total = Column(Integer, default=0)
+    processed = Column(Integer, default=0)
+    imported_count = Column(Integer, default=0)
+    error = Column(Text, nullable=True)
+    # Worker process currently running the job, and until when its claim holds
+    worker_id = Column(String(64), nullable=True)
+    lease_expires_at = Column(DateTime, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+
+class TrackMatch(Base):
+    """Spotify track -> chosen YouTube video, shared by every user's imports."""
+    __tablename__ = "track_matches"
+    
+    # 'spotify:<track id>' or 'meta:<normalized title>|<normalized artist>'
+    key = Column(String(600), primary_key=True)
+    source_duration = Column(Integer, nullable=True)
+    video_id = Column(String(50), ForeignKey("tracks.video_id"), nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    
+    track = relationship("Track", lazy="joined", innerjoin=True)
 
 
 def get_db():
@@ -81,5 +205,295 @@ def get_db():
         db.close()
 
 
-def init_db():
-    Base.metadata.create_all(bind=engine)
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+def _insert_ignore_stmt(dialect: str, model):
+    stmt = DIALECT_INSERTS[dialect](model).on_conflict_do_nothing()
+    return stmt.returning(*model.__table__.primary_key.columns)
+
+
+def _chunks(rows: List[Dict]):
+    size = DB_CONFIG.bulk_chunk_size
+    for start in range(0, len(rows), size):
+        yield rows[start:start + size]
+
+
+def insert_ignore(db: Session, model, rows: List[Dict]) -> int:
+    """
+    INSERT rows with executemany, silently skipping any that hit a unique constraint.
+    Returns how many rows were actually inserted. The caller commits.
+    """
+    if not rows:
+        return 0
+    stmt = _insert_ignore_stmt(db.get_bind().dialect.name, model)
+    # Core execution on the session's connection bypasses the unit of work.
+    # Inserted rows are counted from RETURNING: executemany leaves rowcount
+    # at -1 on some drivers (asyncpg), and skipped rows return nothing.
+    conn = db.connection()
+    return sum(len(conn.execute(stmt, chunk).all()) for chunk in _chunks(rows))
+
+
+async def insert_ignore_async(db: AsyncSession, model, rows: List[Dict]) -> int:
+    """insert_ignore for an AsyncSession."""
+    if not rows:
+        return 0
+    conn = await db.connection()
+    stmt = _insert_ignore_stmt(conn.dialect.name, model)
+    inserted = 0
+    for chunk in _chunks(rows):
+        inserted += len((await conn.execute(stmt, chunk)).all())
+    return inserted
+
+
+def _upsert_stmt(dialect: str, model, keys: List[str], columns: List[str]):
+    stmt = DIALECT_INSERTS[dialect](model)
+    return stmt.on_conflict_do_update(index_elements=keys, set_={name: stmt.excluded[name] for name in columns})
+
+
+async def upsert_async(db: AsyncSession, model, rows: List[Dict], keys: List[str]):
+    """
+    INSERT rows with executemany; a row whose `keys` already exist has its
+    other columns replaced. The last row wins for keys repeated in `rows`.
+    """
+    if not rows:
+        return
+    unique = list({tuple(row[key] for key in keys): row for row in rows}.values())
+    conn = await db.connection()
+    stmt = _upsert_stmt(conn.dialect.name, model, keys, [name for name in unique[0] if name not in keys])
+    for chunk in _chunks(unique):
+        await conn.execute(stmt, chunk)
+
+
+def _upsert_tracks_stmt(dialect: str):
+    """
+    Catalog upsert of metadata taken from YouTube. A field missing from a row keeps
+    its stored value, unless that value was only ever supplied by a client.
+    """
+    stmt = DIALECT_INSERTS[dialect](Track)
+    columns = Track.__table__.c
+    updates = {
+        name: case((columns.verified, func.coalesce(stmt.excluded[name], columns[name])), else_=stmt.excluded[name])
+        for name in TRACK_FIELDS
+    }
+    updates.update({name: func.coalesce(stmt.excluded[name], columns[name]) for name in ("filesize", "mime_type")})
+    return stmt.on_conflict_do_update(
+        index_elements=[Track.video_id],
+        set_={**updates, "verified": stmt.excluded.verified, "updated_at": stmt.excluded.updated_at}
+    )
+
+
+def _catalog_rows(rows: List[Dict], verified: bool) -> List[Dict]:
+    # executemany needs the same keys in every row; one row per video keeps the upsert deterministic
+    now = datetime.utcnow()
+    catalog = {}
+    for row in rows:
+        catalog[row["video_id"]] = {
+            "video_id": row["video_id"],
+            **{name: row.get(name) for name in (*TRACK_FIELDS, "filesize", "mime_type")},
+            "verified": verified,
+            "updated_at": now
+        }
+    return list(catalog.values())
+
+
+def upsert_tracks(db: Session, rows: List[Dict]):
+    """Write video metadata taken from YouTube into the tracks catalog. The caller commits."""
+    if not rows:
+        return
+    stmt = _upsert_tracks_stmt(db.get_bind().dialect.name)
+    conn = db.connection()
+    for chunk in _chunks(_catalog_rows(rows, verified=True)):
+        conn.execute(stmt, chunk)
+
+
+async def upsert_tracks_async(db: AsyncSession, rows: List[Dict]):
+    """upsert_tracks for an AsyncSession."""
+    if not rows:
+        return
+    conn = await db.connection()
+    stmt = _upsert_tracks_stmt(conn.dialect.name)
+    for chunk in _chunks(_catalog_rows(rows, verified=True)):
+        await conn.execute(stmt, chunk)
+
+
+def _library_rows(rows: List[Dict]) -> List[Dict]:
+    return [{k: v for k, v in row.items() if k not in TRACK_FIELDS} for row in rows]
+
+
+def add_to_library(db: Session, model, rows: List[Dict], overwrite: bool = False) -> int:
+    """
+    Insert LikedSong or PlaylistTrack rows given with their track metadata:
+    the metadata goes to the catalog, the rows keep only the video_id.
+    Client-supplied metadata only fills in videos the catalog does not know yet,
+    and stays unverified (out of local search) until YouTube data replaces it;
+    overwrite=True is for data taken from YouTube itself. Returns how many
+    library rows were new.
+    """
+    if overwrite:
+        upsert_tracks(db, rows)
+    else:
+        insert_ignore(db, Track, _catalog_rows(rows, verified=False))
+    return insert_ignore(db, model, _library_rows(rows))
+
+
+async def add_to_library_async(db: AsyncSession, model, rows: List[Dict], overwrite: bool = False) -> int:
+    """add_to_library for an AsyncSession."""
+    if overwrite:
+        await upsert_tracks_async(db, rows)
+    else:
+        await insert_ignore_async(db, Track, _catalog_rows(rows, verified=False))
+    return await insert_ignore_async(db, model, _library_rows(rows))
+
+
+def _migrate_to_catalog(conn, inspector):
+    """Move per-row metadata copies from tables that predate the catalog into `tracks`."""
+    # Matches were copied from YouTube search results; library rows may hold whatever a client sent.
+    # Matches go first so a video in both tables keeps the verified copy.
+    for model, verified in ((TrackMatch, True), (LikedSong, False), (PlaylistTrack, False)):
+        table = model.__tablename__
+        existing = {column["name"] for column in inspector.get_columns(table)}
+        legacy = [name for name in TRACK_FIELDS if name in existing]
+        if not legacy:
+            continue
+        copied = conn.execute(text(
+            f"INSERT INTO tracks (video_id, {', '.join(legacy)}, verified, updated_at) "
+            f"SELECT video_id, {', '.join(f'MAX({name})' for name in legacy)}, :verified, CURRENT_TIMESTAMP FROM {table} "
+            f"WHERE video_id NOT IN (SELECT video_id FROM tracks) GROUP BY video_id"
+        ), {"verified": verified}).rowcount
+        for name in legacy:
+            conn.execute(text(f"ALTER TABLE {table} DROP COLUMN {name}"))
+        # SQLite cannot add a constraint to an existing table and does not enforce it anyway
+        if conn.dialect.name != "sqlite":
+            conn.execute(text(f"ALTER TABLE {table} ADD FOREIGN KEY (video_id) REFERENCES tracks (video_id)"))
+        print(f"[DB] Moved {table} metadata into the tracks catalog ({copied} new tracks)")
+
+
+def _migrate(conn):
+    """Add columns and indexes introduced after the first release to existing tables."""
+    inspector = inspect(conn)
+    for model in (ImportJob, Track):
+        table = model.__tablename__
+        existing = {column["name"] for column in inspector.get_columns(table)}
+        for column in model.__table__.columns:
+            if column.name not in existing:
+                # Only nullable columns are ever added later, so no default is needed
+                conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column.name} {column.type.compile(conn.dialect)}"))
+                print(f"[DB] Added column {table}.{column.name}")
+
+    _migrate_to_catalog(conn, inspector)
+
+    for model in (LikedSong, PlaylistTrack):
+        table = model.__tablename__
+        existing = {index["name"] for index in inspector.get_indexes(table)}
+        for index in model.__table__.indexes:
+            if index.name in existing:
+                continue
+            if index.unique:
+                # Older databases may hold duplicates; keep the oldest row of each
+                cols = ", ".join(column.name for column in index.columns)
+                removed = conn.execute(text(
+                    f"DELETE FROM {table} WHERE id NOT IN (SELECT MIN(id) FROM {table} GROUP BY {cols})"
+                )).rowcount
+                if removed:
+                    print(f"[DB] Removed {removed} duplicate rows from {table} before adding {index.name}")
+            index.create(bind=conn)
+            print(f"[DB] Created index {index.name}")
+
+
+# Full-text index over the catalog's titles and uploaders. FTS rows share the
+# track's rowid so the triggers update in place instead of scanning for video_id.
+SEARCH_INDEX_DDL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS tracks_fts USING fts5("
+    "video_id UNINDEXED, title, uploader, tokenize='unicode61 remove_diacritics 2')",
+    "CREATE TRIGGER IF NOT EXISTS tracks_fts_insert AFTER INSERT ON tracks BEGIN "
+    "INSERT INTO tracks_fts (rowid, video_id, title, uploader) VALUES (new.rowid, new.video_id, new.title, new.uploader); "
+    "END",
+    # Catalog upserts touch every row they meet; only real text changes reach the index
+    "CREATE TRIGGER IF NOT EXISTS tracks_fts_update AFTER UPDATE OF title, uploader ON tracks "
+    "WHEN old.title IS NOT new.title OR old.uploader IS NOT new.uploader BEGIN "
+    "UPDATE tracks_fts SET title = new.title, uploader = new.uploader WHERE rowid = new.rowid; "
+    "END",
+    "CREATE TRIGGER IF NOT EXISTS tracks_fts_delete AFTER DELETE ON tracks BEGIN "
+    "DELETE FROM tracks_fts WHERE rowid = old.rowid; "
+    "END",
+]
+
+
+def _create_search_index(conn):
+    """Create the FTS5 index on SQLite and rebuild it if it drifted from the catalog."""
+    if conn.dialect.name != "sqlite":
+        return
+    try:
+        for statement in SEARCH_INDEX_DDL:
+            conn.exec_driver_sql(statement)
+    except DBAPIError as e:
+        if "fts5" not in str(e.orig).lower():
+            raise
+        print(f"[DB] WARNING: SQLite has no FTS5, local search falls back to LIKE: {e.orig}")
+        return
+
+    # Tracks without an index row (e.g. added before the index existed), or rowids
+    # renumbered by VACUUM, show up as a mismatch here
+    total, indexed = conn.exec_driver_sql(
+        "SELECT (SELECT COUNT(*) FROM tracks), "
+        "(SELECT COUNT(*) FROM tracks JOIN tracks_fts ON tracks_fts.rowid = tracks.rowid "
+        "WHERE tracks_fts.video_id = tracks.video_id)"
+    ).one()
+    fts_total = conn.exec_driver_sql("SELECT COUNT(*) FROM tracks_fts").scalar()
+    if total == indexed == fts_total:
+        return
+    conn.exec_driver_sql("DELETE FROM tracks_fts")
+    conn.exec_driver_sql(
+        "INSERT INTO tracks_fts (rowid, video_id, title, uploader) "
+        "SELECT rowid, video_id, title, uploader FROM tracks"
+    )
+    print(f"[DB] Rebuilt the search index ({total} tracks)")
+
+
+def db_settings() -> dict:
+    """The storage settings actually in effect on a pooled connection."""
+    with engine.connect() as conn:
+        if not IS_SQLITE:
+            version = conn.dialect.server_version_info or ()
+            return {"dialect": conn.dialect.name, "server_version": ".".join(str(part) for part in version)}
+        return {name: conn.exec_driver_sql(f"PRAGMA {name}").scalar() for name in SQLITE_PRAGMAS}
+
+
+def check_db():
+    """Log the active storage settings and flag any the driver did not accept."""
+    active = db_settings()
+    url = DATABASE_URL.render_as_string(hide_password=True)
+    print(f"[DB] {url}: " + ", ".join(f"{name}={value}" for name, value in active.items()))
+    if not IS_SQLITE:
+        return
+    # journal_mode and synchronous read back in different spellings, so compare those loosely
+    synchronous_levels = {"0": "OFF", "1": "NORMAL", "2": "FULL", "3": "EXTRA"}
+    for name, wanted in SQLITE_PRAGMAS.items():
+        value = active[name]
+        if name == "synchronous":
+            value = synchronous_levels.get(str(value), value)
+        if str(value).lower() != str(wanted).lower():
+            print(f"[DB] WARNING: PRAGMA {name} is {active[name]}, configured {wanted}")
+
+
+def init_db(attempts: int = 5):
+    # Workers start together; whichever loses a race to create a table or index retries
+    for attempt in range(1, attempts + 1):
+        try:
+            Base.metadata.create_all(bind=engine)
+            with engine.begin() as conn:
+                _migrate(conn)
+                _create_search_index(conn)
+            return
+        except DBAPIError as e:
+            if attempt == attempts:
+                raise
+            print(f"[DB] Schema setup collided with another worker, retrying: {e.orig}")
+            time.sleep(0.2 * attempt)
+
+
+async def close_db():
+    await async_engine.dispose()
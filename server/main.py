@@ -1,30 +1,62 @@
 from fastapi import FastAPI, HTTPException, Depends, Query, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import StreamingResponse
-from pydantic import BaseModel
-from sqlalchemy.orm import Session
-from typing import Optional
+from starlette.background import BackgroundTask
+from pydantic import BaseModel, Field
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, selectinload
+from typing import Annotated, List, Literal, Optional
 from core.config import CONFIG
-from services.youtube import youtube_service
-from services.spotify import spotify_service
+from core.executors import executor_stats, shutdown_executors
+from core.persistent_cache import WORKER_ID
+from services.youtube import youtube_service, extract_playlist_id, STALE_STREAM_STATUSES
+from services.catalog import track_catalog
+from services.spotify import spotify_service, SpotifyCredentials, SpotifyError
 from services.auth import (
     hash_password, verify_password, create_access_token,
-    get_current_user, get_current_user_optional
+    get_current_user, get_current_user_optional, get_current_identity, get_admin_identity, Identity
 )
 from services.lyrics import lyrics_service
+from services.audio_cache import audio_cache, parse_range
+from services.http_client import audio_http, spotify_http
 
-from database import get_db, init_db, User, LikedSong, Playlist, PlaylistTrack
+from services.imports import import_jobs, job_to_dict, TERMINAL_STATUSES
+from services.matcher import track_matcher
+from services.prefetch import prefetch_service
+
+from database import (
+    engine, get_db, get_async_db, init_db, check_db, close_db, db_settings,
+    add_to_library,
+    User, LikedSong, Playlist, PlaylistTrack, ImportJob
+)
 import uvicorn
 import httpx
 import time
 import asyncio
+import bisect
+import hashlib
+import json
+import re
 
 app = FastAPI(title="Mobify API")
 
 # Initialize database on startup
 @app.on_event("startup")
-def startup():
+async def startup():
     init_db()
+    check_db()
+    youtube_service.warm_up()
+    await import_jobs.resume_pending()
+    import_jobs.start_maintenance()
+
+@app.on_event("shutdown")
+async def shutdown():
+    await import_jobs.shutdown()
+    await audio_http.close()
+    await spotify_http.close()
+    await close_db()
+    shutdown_executors()
 
 # CORS Setup
 app.add_middleware(
@@ -37,6 +69,9 @@ app.add_middleware(
 
 # ============== Pydantic Models ==============
 
+# YouTube video ids are 11 URL-safe base64 characters
+VideoId = Annotated[str, Field(pattern=r"^[A-Za-z0-9_-]{11}$")]
+
 class RegisterRequest(BaseModel):
     username: str
     password: str
@@ -46,12 +81,18 @@ class LoginRequest(BaseModel):
     password: str
 
 class TrackData(BaseModel):
-    video_id: str
+    video_id: VideoId
     title: str
     uploader: str
     thumbnail: str
     duration: int
 
+class TrackBatchRequest(BaseModel):
+    tracks: List[TrackData]
+
+class VideoIdsRequest(BaseModel):
+    video_ids: List[str]
+
 class PlaylistCreate(BaseModel):
     name: str
 
@@ -70,6 +111,15 @@ class YoutubeUrlImportRequest(BaseModel):
     url: str
     name: str
 
+class PrefetchTrack(BaseModel):
+    video_id: VideoId
+    title: Optional[str] = None
+    uploader: Optional[str] = None
+
+class PrefetchRequest(BaseModel):
+    tracks: List[PrefetchTrack]
+    audio: bool = True
+
 @app.get("/config")
 def get_public_config():
     return {
@@ -118,111 +168,60 @@ def spotify_status(user: User = Depends(get_current_user)):
         "token_expired": user.spotify_token_expiry < time.time() if user.spotify_token_expiry else True
     }
 
-@app.get("/spotify/playlists")
-def spotify_playlists(user: User = Depends(get_current_user)):
+def _spotify_credentials(user: User) -> SpotifyCredentials:
     if not user.spotify_access_token:
         raise HTTPException(status_code=400, detail="Spotify not connected")
-    
-    # Refresh token if needed
-    # (Simplified for now, assumes token is valid or we handle refresh logic)
-    
+    return SpotifyCredentials(user)
+
+async def _spotify_call(coro):
+    # Expired sessions surface as 401 so clients can prompt a reconnect
     try:
-        playlists = spotify_service.get_user_playlists(user.spotify_access_token)
-        return {"playlists": playlists}
-    except Exception as e:
-        # Handle expired token by suggesting a reconnect or implementing silent refresh
-        raise HTTPException(status_code=500, detail=str(e))
+        return await coro
+    except SpotifyError as e:
+        raise HTTPException(status_code=401 if e.status_code == 401 else 502, detail=str(e))
+
+@app.get("/spotify/playlists")
+async def spotify_playlists(user: User = Depends(get_current_user)):
+    creds = _spotify_credentials(user)
+    playlists = await _spotify_call(spotify_service.get_user_playlists(creds))
+    return {"playlists": playlists}
 
 @app.get("/spotify/playlists/{playlist_id}")
-def spotify_playlist_tracks(playlist_id: str, user: User = Depends(get_current_user)):
-    if not user.spotify_access_token:
-        raise HTTPException(status_code=400, detail="Spotify not connected")
-    
-    try:
-        tracks = spotify_service.get_playlist_tracks(user.spotify_access_token, playlist_id)
-        return {"tracks": tracks}
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+async def spotify_playlist_tracks(playlist_id: str, user: User = Depends(get_current_user)):
+    creds = _spotify_credentials(user)
+    tracks = await _spotify_call(spotify_service.get_playlist_tracks(creds, playlist_id))
+    return {"tracks": tracks}
 
 @app.get("/spotify/me/tracks")
-def spotify_saved_tracks(user: User = Depends(get_current_user)):
-    if not user.spotify_access_token:
-        raise HTTPException(status_code=400, detail="Spotify not connected")
-    
-    try:
-        tracks = spotify_service.get_user_saved_tracks(user.spotify_access_token)
-        return {"tracks": tracks}
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+async def spotify_saved_tracks(user: User = Depends(get_current_user)):
+    creds = _spotify_credentials(user)
+    tracks = await _spotify_call(spotify_service.get_user_saved_tracks(creds))
+    return {"tracks": tracks}
 
 @app.post("/spotify/import/playlist")
-async def spotify_import_playlist(req: SpotifyImportRequest, user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    if not user.spotify_access_token:
-        raise HTTPException(status_code=400, detail="Spotify not connected")
-    
-    tracks = spotify_service.get_playlist_tracks(user.spotify_access_token, req.spotify_id)
+async def spotify_import_playlist(req: SpotifyImportRequest, user: User = Depends(get_current_user), db: AsyncSession = Depends(get_async_db)):
+    creds = _spotify_credentials(user)
+    tracks = await _spotify_call(spotify_service.get_playlist_tracks(creds, req.spotify_id))
     
     # Create Mobify playlist
     db_playlist = Playlist(user_id=user.id, name=req.name)
     db.add(db_playlist)
-    db.commit()
-    db.refresh(db_playlist)
+    await db.commit()
     
-    imported_count = 0
-    for track in tracks:
-        query = f"{track['title']} {track['artist']}"
-        search_results = await youtube_service.search(query, limit=1)
-        if search_results:
-            yt_track = search_results[0]
-            db_track = PlaylistTrack(
-                playlist_id=db_playlist.id,
-                video_id=yt_track['id'],
-                title=yt_track['title'],
-                uploader=yt_track['uploader'],
-                thumbnail=yt_track['thumbnail'],
-                duration=yt_track['duration'],
-                position=imported_count
-            )
-            db.add(db_track)
-            imported_count += 1
-            
-    db.commit()
-    return {"success": True, "imported_count": imported_count, "playlist_id": db_playlist.id}
+    # YouTube matching runs in the background; progress via /imports/{job_id}
+    job = await import_jobs.create(db, user.id, "spotify_playlist", req.name, tracks, playlist_id=db_playlist.id)
+    return {"success": True, **job_to_dict(job)}
 
 @app.post("/spotify/import/liked")
-async def spotify_import_liked(user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    if not user.spotify_access_token:
-        raise HTTPException(status_code=400, detail="Spotify not connected")
-    
-    tracks = spotify_service.get_user_saved_tracks(user.spotify_access_token)
+async def spotify_import_liked(user: User = Depends(get_current_user), db: AsyncSession = Depends(get_async_db)):
+    creds = _spotify_credentials(user)
+    tracks = await _spotify_call(spotify_service.get_user_saved_tracks(creds))
     
-    imported_count = 0
-    for track in tracks:
-        # Check if already liked
-        # (Simplified: just search and add if not present)
-        query = f"{track['title']} {track['artist']}"
-        search_results = await youtube_service.search(query, limit=1)
-        if search_results:
-            yt_track = search_results[0]
-            # Check if video_id already in liked
-            exists = db.query(LikedSong).filter(LikedSong.user_id == user.id, LikedSong.video_id == yt_track['id']).first()
-            if not exists:
-                db_liked = LikedSong(
-                    user_id=user.id,
-                    video_id=yt_track['id'],
-                    title=yt_track['title'],
-                    uploader=yt_track['uploader'],
-                    thumbnail=yt_track['thumbnail'],
-                    duration=yt_track['duration']
-                )
-                db.add(db_liked)
-                imported_count += 1
-                
-    db.commit()
-    return {"success": True, "imported_count": imported_count}
+    job = await import_jobs.create(db, user.id, "spotify_liked", "Liked Songs", tracks)
+    return {"success": True, **job_to_dict(job)}
 
 @app.post("/spotify/import/url")
-async def spotify_import_url(req: SpotifyUrlImportRequest, user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+async def spotify_import_url(req: SpotifyUrlImportRequest, user: User = Depends(get_current_user), db: AsyncSession = Depends(get_async_db)):
     print(f"[SPOTIFY] DEBUG: Starting direct import for URL: {req.url}")
     tracks = await spotify_service.get_tracks_by_url(req.url)
     
@@ -234,76 +233,76 @@ async def spotify_import_url(req: SpotifyUrlImportRequest, user: User = Depends(
     # Create Mobify playlist
     db_playlist = Playlist(user_id=user.id, name=req.name)
     db.add(db_playlist)
-    db.commit()
-    db.refresh(db_playlist)
-    
-    # Process tracks in parallel with a semaphore to avoid rate limiting
-    semaphore = asyncio.Semaphore(5)
-    
-    async def process_track(track, position):
-        async with semaphore:
-            query = f"{track['title']} {track['artist']}"
-            print(f"[SPOTIFY] DEBUG: Searching YouTube for: {query}")
-            search_results = await youtube_service.search(query, limit=1)
-            if search_results:
-                yt_track = search_results[0]
-                return PlaylistTrack(
-                    playlist_id=db_playlist.id,
-                    video_id=yt_track['id'],
-                    title=yt_track['title'],
-                    uploader=yt_track['uploader'],
-                    thumbnail=yt_track['thumbnail'],
-                    duration=yt_track['duration'],
-                    position=position
-                )
-            return None
-
-    print(f"[SPOTIFY] DEBUG: Processing {len(tracks)} tracks in parallel...")
-    tasks = [process_track(track, i) for i, track in enumerate(tracks)]
-    db_tracks = await asyncio.gather(*tasks)
-    
-    imported_count = 0
-    for db_track in db_tracks:
-        if db_track:
-            db.add(db_track)
-            imported_count += 1
-            
-    db.commit()
-    print(f"[SPOTIFY] DEBUG: Import complete. Successfully imported {imported_count} tracks.")
-    return {"success": True, "imported_count": imported_count, "playlist_id": db_playlist.id}
+    await db.commit()
+    
+    job = await import_jobs.create(db, user.id, "spotify_url", req.name, tracks, playlist_id=db_playlist.id)
+    return {"success": True, **job_to_dict(job)}
+
+# ============== Import Jobs ==============
+
+async def _get_user_job(job_id: str, user: Identity, db: AsyncSession) -> ImportJob:
+    job = (await db.execute(
+        select(ImportJob).where(ImportJob.id == job_id, ImportJob.user_id == user.id)
+    )).scalar_one_or_none()
+    if not job:
+        raise HTTPException(status_code=404, detail="Import job not found")
+    return job
+
+@app.get("/imports")
+async def list_imports(user: Identity = Depends(get_current_identity), db: AsyncSession = Depends(get_async_db)):
+    jobs = (await db.execute(
+        select(ImportJob).where(ImportJob.user_id == user.id).order_by(ImportJob.created_at.desc()).limit(50)
+    )).scalars().all()
+    return {"jobs": [job_to_dict(j) for j in jobs]}
+
+@app.get("/imports/{job_id}")
+async def get_import(job_id: str, user: Identity = Depends(get_current_identity), db: AsyncSession = Depends(get_async_db)):
+    return job_to_dict(await _get_user_job(job_id, user, db))
+
+@app.get("/imports/{job_id}/events")
+async def import_events(job_id: str, user: Identity = Depends(get_current_identity), db: AsyncSession = Depends(get_async_db)):
+    await _get_user_job(job_id, user, db)
+
+    async def event_stream():
+        last = None
+        while True:
+            status = await import_jobs.get_status(job_id)
+            if status is None:
+                return
+            if status != last:
+                yield f"data: {json.dumps(status)}\n\n"
+                last = status
+            if status["status"] in TERMINAL_STATUSES:
+                return
+            await asyncio.sleep(1)
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+@app.post("/imports/{job_id}/cancel")
+async def cancel_import(job_id: str, user: Identity = Depends(get_current_identity), db: AsyncSession = Depends(get_async_db)):
+    job = await _get_user_job(job_id, user, db)
+    await import_jobs.cancel(db, job)
+    return job_to_dict(job)
+
+@app.post("/imports/{job_id}/resume")
+async def resume_import(job_id: str, user: Identity = Depends(get_current_identity), db: AsyncSession = Depends(get_async_db)):
+    job = await _get_user_job(job_id, user, db)
+    await import_jobs.resume(db, job)
+    return job_to_dict(job)
 
 @app.post("/youtube/import/url")
-async def youtube_import_url(req: YoutubeUrlImportRequest, user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+async def youtube_import_url(req: YoutubeUrlImportRequest, user: Identity = Depends(get_current_identity), db: AsyncSession = Depends(get_async_db)):
     print(f"[YOUTUBE] DEBUG: Starting direct import for URL: {req.url}")
-    tracks = await youtube_service.get_playlist_tracks(req.url)
-    
-    if not tracks:
-        print("[YOUTUBE] DEBUG: No tracks found or playlist is private")
-        raise HTTPException(status_code=400, detail="Could not fetch tracks from YouTube URL or playlist is empty/private")
-    
-    print(f"[YOUTUBE] DEBUG: Found {len(tracks)} tracks, creating playlist: {req.name}")
+    if not extract_playlist_id(req.url):
+        raise HTTPException(status_code=400, detail="URL is not a YouTube playlist")
+
     db_playlist = Playlist(user_id=user.id, name=req.name)
     db.add(db_playlist)
-    db.commit()
-    db.refresh(db_playlist)
-    
-    imported_count = 0
-    for i, track in enumerate(tracks):
-        db_track = PlaylistTrack(
-            playlist_id=db_playlist.id,
-            video_id=track['id'],
-            title=track['title'],
-            uploader=track['uploader'],
-            thumbnail=track['thumbnail'],
-            duration=track['duration'],
-            position=i
-        )
-        db.add(db_track)
-        imported_count += 1
-            
-    db.commit()
-    print(f"[YOUTUBE] DEBUG: Import complete. Successfully imported {imported_count} tracks.")
-    return {"success": True, "imported_count": imported_count, "playlist_id": db_playlist.id}
+    await db.commit()
+
+    # Pages are stored as they arrive, so the playlist fills in while the job runs
+    job = await import_jobs.create_youtube(db, user.id, req.name, req.url, db_playlist.id)
+    return {"success": True, **job_to_dict(job)}
 
 # ============== Root ==============
 
@@ -340,22 +339,40 @@ def login(data: LoginRequest, db: Session = Depends(get_db)):
     return {"token": token, "user": {"id": user.id, "username": user.username}}
 
 @app.get("/auth/me")
-def get_me(user: User = Depends(get_current_user)):
+def get_me(user: Identity = Depends(get_current_identity)):
     return {"id": user.id, "username": user.username}
 
 # ============== Search ==============
 
+async def _hybrid_search(query: str, limit: int, offset: int) -> List[dict]:
+    """Catalog matches first, then YouTube results for whatever the catalog cannot fill."""
+    # Everything up to this page, so the local total is known once the page runs short
+    local = await track_catalog.search(query, limit=offset + limit)
+    results = local[offset:offset + limit]
+    if len(results) == limit:
+        return results
+    seen = {track['id'] for track in local}
+    # A full page from YouTube leaves room for results the catalog already returned
+    remote = await youtube_service.search(query, limit=limit, offset=max(offset - len(local), 0))
+    return (results + [track for track in remote if track['id'] not in seen])[:limit]
+
 @app.get("/search")
 async def search(
     query: str,
     page: int = Query(1, ge=1),
-    limit: int = Query(10, ge=1, le=30)
+    limit: int = Query(10, ge=1, le=30),
+    source: Literal["youtube", "local", "hybrid"] = "youtube"
 ):
     if not query:
         raise HTTPException(status_code=400, detail="Query parameter 'query' is required")
     try:
         offset = (page - 1) * limit
-        results = await youtube_service.search(query, limit=limit, offset=offset)
+        if source == "local":
+            results = await track_catalog.search(query, limit=limit, offset=offset)
+        elif source == "hybrid":
+            results = await _hybrid_search(query, limit, offset)
+        else:
+            results = await youtube_service.search(query, limit=limit, offset=offset)
         return {
             "results": results,
             "page": page,
@@ -393,113 +410,268 @@ async def get_lyrics(query: str):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.get("/lyrics/lines")
+async def get_lyrics_lines(
+    request: Request,
+    query: str,
+    at: Optional[int] = Query(None, ge=0),
+    window: int = Query(8, ge=1, le=100)
+):
+    """
+    Pre-parsed lyrics as [[ms, text], ...]. With ?at=ms only the active line
+    and the `window` lines after it are returned; `start` is the index of the first one.
+    """
+    if not query:
+        raise HTTPException(status_code=400, detail="Query is required")
+    lines = await lyrics_service.get_lines(query)
+    synced = bool(lines) and lines[0][0] is not None
+
+    start = 0
+    if lines and synced and at is not None:
+        active = bisect.bisect_right([line[0] for line in lines], at) - 1
+        start = max(active, 0)
+        lines = lines[start:start + window + 1]
+
+    body = {"synced": synced, "start": start, "lines": lines}
+    payload = json.dumps(body, separators=(",", ":"), ensure_ascii=False)
+    etag = '"' + hashlib.sha1(payload.encode("utf-8")).hexdigest() + '"'
+    headers = {
+        "ETag": etag,
+        # Misses are retried server-side after lyrics_miss_ttl, so let clients recheck sooner
+        "Cache-Control": "public, max-age=86400" if lines else "public, max-age=3600"
+    }
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    return Response(content=payload, media_type="application/json", headers=headers)
+
+@app.post("/prefetch")
+async def prefetch(req: PrefetchRequest, user: Identity = Depends(get_current_identity)):
+    # Fire and forget: warms stream URL, lyrics and audio for the upcoming queue
+    scheduled = prefetch_service.schedule([t.dict() for t in req.tracks], audio=req.audio)
+    return {"scheduled": scheduled}
+
+def _full_body_size(resp: httpx.Response) -> Optional[int]:
+    """Total file size when the upstream response carries the whole file, else None."""
+    if resp.status_code == 200:
+        length = resp.headers.get("Content-Length")
+        return int(length) if length and length.isdigit() else None
+    if resp.status_code == 206:
+        content_range = resp.headers.get("Content-Range", "")
+        match = re.match(r"bytes 0-(\d+)/(\d+)", content_range)
+        if match and int(match.group(1)) + 1 == int(match.group(2)):
+            return int(match.group(2))
+    return None
+
+def _serve_cached_audio(cached: dict, range_header: Optional[str]):
+    size = cached["size"]
+    byte_range = parse_range(range_header, size)
+    if byte_range is None:
+        return Response(status_code=416, headers={"Content-Range": f"bytes */{size}"})
+
+    start, end = byte_range
+    headers = {
+        "Accept-Ranges": "bytes",
+        "Content-Type": cached["content_type"],
+        "Content-Length": str(end - start + 1),
+        "Cache-Control": "public, max-age=3600",
+        "Connection": "keep-alive"
+    }
+    status_code = 200
+    if range_header:
+        status_code = 206
+        headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+
+    # Sync iterator: starlette runs the mmap reads in its threadpool
+    return StreamingResponse(
+        audio_cache.iter_file(cached["path"], start, end),
+        status_code=status_code,
+        headers=headers
+    )
+
 @app.get("/audio/{video_id}")
 async def proxy_audio(video_id: str, request: Request):
+    range_header = request.headers.get("range")
+
+    cached = audio_cache.lookup(video_id)
+    if cached:
+        return _serve_cached_audio(cached, range_header)
+
     try:
         # Get stream data once
         stream_data = await youtube_service.get_stream_url(video_id)
         url = stream_data['stream_url']
-        
+
+        # Size/type remembered from extraction lets us reject bad ranges locally
+        content_info = youtube_service.get_content_info(video_id)
+        size = content_info['size'] if content_info else None
+
         # Relay range header
-        range_header = request.headers.get("range")
-        headers = {
-            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
-        }
+        headers = {}
         if range_header:
-            headers["range"] = range_header
+            if size:
+                byte_range = parse_range(range_header, size)
+                if byte_range is None:
+                    return Response(status_code=416, headers={"Content-Range": f"bytes */{size}"})
+                headers["range"] = f"bytes={byte_range[0]}-{byte_range[1]}"
+            else:
+                headers["range"] = range_header
+
+        # Shared pooled client: reuses keep-alive/HTTP2 connections to googlevideo
+        client = audio_http.client
+
+        # Single upstream request: status and headers come from the body response itself
+        upstream = await client.send(client.build_request("GET", url, headers=headers), stream=True)
+
+        # A cached URL googlevideo no longer accepts: drop it everywhere and extract once more
+        if upstream.status_code in STALE_STREAM_STATUSES:
+            await upstream.aclose()
+            await youtube_service.invalidate_stream(video_id)
+            url = (await youtube_service.get_stream_url(video_id))['stream_url']
+            upstream = await client.send(client.build_request("GET", url, headers=headers), stream=True)
+
+        # Relay 403/401/etc from YouTube if they happen
+        if upstream.status_code >= 400:
+            await upstream.aclose()
+            if upstream.status_code in STALE_STREAM_STATUSES:
+                await youtube_service.invalidate_stream(video_id)
+            raise HTTPException(status_code=502, detail=f"Error from YouTube: {upstream.status_code}")
+
+        response_headers = {
+            "Accept-Ranges": "bytes",
+            "Content-Type": upstream.headers.get("Content-Type") or (content_info or {}).get("mime_type") or "audio/mpeg",
+            "Content-Length": upstream.headers.get("Content-Length"),
+            "Content-Range": upstream.headers.get("Content-Range"),
+            "Cache-Control": "public, max-age=3600",
+            "Connection": "keep-alive"
+        }
+
+        # Fill in what upstream left out from the known file size
+        if size and upstream.status_code == 200 and not response_headers["Content-Length"]:
+            response_headers["Content-Length"] = str(size)
+        if size and upstream.status_code == 206 and not response_headers["Content-Range"] and "range" in headers:
+            start, end = parse_range(headers["range"], size)
+            response_headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+            response_headers["Content-Length"] = str(end - start + 1)
+
+        # Filter None
+        response_headers = {k: v for k, v in response_headers.items() if v is not None}
 
         async def stream_generator():
-            async with httpx.AsyncClient(timeout=60.0) as client:
-                async with client.stream("GET", url, headers=headers, follow_redirects=True) as r:
-                    # Relay 403/401/etc from YouTube if they happen
-                    if r.status_code >= 400:
-                        yield b"Error from YouTube: " + str(r.status_code).encode()
-                        return
-                    async for chunk in r.aiter_bytes(chunk_size=128*1024): # Increased to 128KB
-                        yield chunk
-
-        # Initial probe for headers
-        async with httpx.AsyncClient(timeout=10.0) as client:
-            source_resp = await client.head(url, headers=headers, follow_redirects=True)
-            
-            # If head fails, try a tiny get
-            if source_resp.status_code >= 400:
-                 source_resp = await client.get(url, headers={**headers, "Range": "bytes=0-0"}, follow_redirects=True)
-
-            status_code = source_resp.status_code
-            response_headers = {
-                "Accept-Ranges": "bytes",
-                "Content-Type": source_resp.headers.get("Content-Type", "audio/mpeg"),
-                "Content-Length": source_resp.headers.get("Content-Length"),
-                "Content-Range": source_resp.headers.get("Content-Range"),
-                "Cache-Control": "public, max-age=3600",
-                "Connection": "keep-alive"
-            }
-            
-            # Filter None
-            response_headers = {k: v for k, v in response_headers.items() if v is not None}
-            
-            return StreamingResponse(
-                stream_generator(),
-                status_code=status_code,
-                headers=response_headers
-            )
-            
+            # Tee full-file responses into the audio cache for later replays
+            writer = None
+            full_size = _full_body_size(upstream)
+            if full_size:
+                writer = audio_cache.open_writer(video_id, response_headers["Content-Type"], full_size)
+
+            try:
+                async for chunk in upstream.aiter_bytes(chunk_size=128*1024): # Increased to 128KB
+                    if writer:
+                        await writer.write(chunk)
+                    yield chunk
+            except BaseException:
+                # Client disconnected (seek/skip) or upstream failed mid-stream
+                if writer:
+                    writer.abort()
+                raise
+            finally:
+                await upstream.aclose()
+            if writer:
+                await writer.commit()
+
+        return StreamingResponse(
+            stream_generator(),
+            status_code=upstream.status_code,
+            headers=response_headers,
+            # Releases the pooled connection if the body is never iterated
+            background=BackgroundTask(upstream.aclose)
+        )
+
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"[ERROR] Proxy Audio failed: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 # ============== Liked Songs ==============
 
+# Upper bound on ids per batch call, well under SQLite's bound-parameter limit
+MAX_BATCH_SIZE = 500
+
+def _unique_ids(video_ids: List[str]) -> List[str]:
+    if len(video_ids) > MAX_BATCH_SIZE:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_SIZE} tracks per request")
+    return list(dict.fromkeys(video_ids))
+
+def _unique_tracks(tracks: List[TrackData]) -> List[TrackData]:
+    _unique_ids([t.video_id for t in tracks])
+    # A repeated video keeps its first copy and its first position
+    seen = {}
+    for t in tracks:
+        seen.setdefault(t.video_id, t)
+    return list(seen.values())
+
 @app.get("/liked")
-def get_liked_songs(user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+def get_liked_songs(user: Identity = Depends(get_current_identity), db: Session = Depends(get_db)):
     songs = db.query(LikedSong).filter(LikedSong.user_id == user.id).order_by(LikedSong.added_at.desc()).all()
     return {
         "tracks": [
             {
                 "id": s.video_id,
-                "title": s.title,
-                "uploader": s.uploader,
-                "thumbnail": s.thumbnail,
-                "duration": s.duration
+                "title": s.track.title,
+                "uploader": s.track.uploader,
+                "thumbnail": s.track.thumbnail,
+                "duration": s.track.duration
             }
             for s in songs
         ]
     }
 
 @app.get("/liked/{video_id}")
-def check_liked(video_id: str, user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+def check_liked(video_id: str, user: Identity = Depends(get_current_identity), db: Session = Depends(get_db)):
     exists = db.query(LikedSong).filter(
         LikedSong.user_id == user.id,
         LikedSong.video_id == video_id
     ).first() is not None
     return {"liked": exists}
 
-@app.post("/liked")
-def add_liked(track: TrackData, user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    # Check if already liked
-    existing = db.query(LikedSong).filter(
+@app.post("/liked/check")
+def check_liked_batch(req: VideoIdsRequest, user: Identity = Depends(get_current_identity), db: Session = Depends(get_db)):
+    video_ids = _unique_ids(req.video_ids)
+    liked = {
+        video_id for (video_id,) in db.query(LikedSong.video_id).filter(
+            LikedSong.user_id == user.id,
+            LikedSong.video_id.in_(video_ids)
+        )
+    } if video_ids else set()
+    return {"liked": {video_id: video_id in liked for video_id in video_ids}}
+
+@app.post("/liked/batch")
+def add_liked_batch(req: TrackBatchRequest, user: Identity = Depends(get_current_identity), db: Session = Depends(get_db)):
+    tracks = _unique_tracks(req.tracks)
+    added = add_to_library(db, LikedSong, [{"user_id": user.id, **t.dict()} for t in tracks])
+    db.commit()
+    return {"added": added, "skipped": len(tracks) - added}
+
+@app.post("/liked/batch/remove")
+def remove_liked_batch(req: VideoIdsRequest, user: Identity = Depends(get_current_identity), db: Session = Depends(get_db)):
+    video_ids = _unique_ids(req.video_ids)
+    removed = db.query(LikedSong).filter(
         LikedSong.user_id == user.id,
-        LikedSong.video_id == track.video_id
-    ).first()
-    
-    if existing:
-        return {"message": "Already liked"}
-    
-    song = LikedSong(
-        user_id=user.id,
-        video_id=track.video_id,
-        title=track.title,
-        uploader=track.uploader,
-        thumbnail=track.thumbnail,
-        duration=track.duration
-    )
-    db.add(song)
+        LikedSong.video_id.in_(video_ids)
+    ).delete(synchronize_session=False) if video_ids else 0
     db.commit()
+    return {"removed": removed}
+
+@app.post("/liked")
+def add_liked(track: TrackData, user: Identity = Depends(get_current_identity), db: Session = Depends(get_db)):
+    inserted = add_to_library(db, LikedSong, [{"user_id": user.id, **track.dict()}])
+    db.commit()
+    if not inserted:
+        return {"message": "Already liked"}
     return {"message": "Added to liked songs"}
 
 @app.delete("/liked/{video_id}")
-def remove_liked(video_id: str, user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+def remove_liked(video_id: str, user: Identity = Depends(get_current_identity), db: Session = Depends(get_db)):
     song = db.query(LikedSong).filter(
         LikedSong.user_id == user.id,
         LikedSong.video_id == video_id
@@ -513,22 +685,41 @@ def remove_liked(video_id: str, user: User = Depends(get_current_user), db: Sess
 
 # ============== Playlists ==============
 
+def _get_user_playlist(playlist_id: int, user: Identity, db: Session) -> Playlist:
+    playlist = db.query(Playlist).filter(Playlist.id == playlist_id, Playlist.user_id == user.id).first()
+    if not playlist:
+        raise HTTPException(status_code=404, detail="Playlist not found")
+    return playlist
+
+def _next_position(db: Session, playlist_id: int) -> int:
+    # Removals leave gaps, so append after the highest position rather than at count()
+    max_pos = db.query(func.max(PlaylistTrack.position)).filter(PlaylistTrack.playlist_id == playlist_id).scalar()
+    return 0 if max_pos is None else max_pos + 1
+
 @app.get("/playlists")
-def get_playlists(user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    playlists = db.query(Playlist).filter(Playlist.user_id == user.id).order_by(Playlist.created_at.desc()).all()
+def get_playlists(user: Identity = Depends(get_current_identity), db: Session = Depends(get_db)):
+    # Count in SQL instead of loading every PlaylistTrack row just to len() it
+    playlists = (
+        db.query(Playlist.id, Playlist.name, func.count(PlaylistTrack.id))
+        .outerjoin(PlaylistTrack, PlaylistTrack.playlist_id == Playlist.id)
+        .filter(Playlist.user_id == user.id)
+        .group_by(Playlist.id, Playlist.name, Playlist.created_at)
+        .order_by(Playlist.created_at.desc())
+        .all()
+    )
     return {
         "playlists": [
             {
-                "id": p.id,
-                "name": p.name,
-                "track_count": len(p.tracks)
+                "id": playlist_id,
+                "name": name,
+                "track_count": track_count
             }
-            for p in playlists
+            for playlist_id, name, track_count in playlists
         ]
     }
 
 @app.post("/playlists")
-def create_playlist(data: PlaylistCreate, user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+def create_playlist(data: PlaylistCreate, user: Identity = Depends(get_current_identity), db: Session = Depends(get_db)):
     playlist = Playlist(user_id=user.id, name=data.name)
     db.add(playlist)
     db.commit()
@@ -536,8 +727,8 @@ def create_playlist(data: PlaylistCreate, user: User = Depends(get_current_user)
     return {"id": playlist.id, "name": playlist.name}
 
 @app.get("/playlists/{playlist_id}")
-def get_playlist(playlist_id: int, user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    playlist = db.query(Playlist).filter(
+def get_playlist(playlist_id: int, user: Identity = Depends(get_current_identity), db: Session = Depends(get_db)):
+    playlist = db.query(Playlist).options(selectinload(Playlist.tracks)).filter(
         Playlist.id == playlist_id,
         Playlist.user_id == user.id
     ).first()
@@ -551,17 +742,17 @@ def get_playlist(playlist_id: int, user: User = Depends(get_current_user), db: S
         "tracks": [
             {
                 "id": t.video_id,
-                "title": t.title,
-                "uploader": t.uploader,
-                "thumbnail": t.thumbnail,
-                "duration": t.duration
+                "title": t.track.title,
+                "uploader": t.track.uploader,
+                "thumbnail": t.track.thumbnail,
+                "duration": t.track.duration
             }
             for t in playlist.tracks
         ]
     }
 
 @app.put("/playlists/{playlist_id}")
-def rename_playlist(playlist_id: int, data: PlaylistRename, user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+def rename_playlist(playlist_id: int, data: PlaylistRename, user: Identity = Depends(get_current_identity), db: Session = Depends(get_db)):
     playlist = db.query(Playlist).filter(
         Playlist.id == playlist_id,
         Playlist.user_id == user.id
@@ -575,7 +766,7 @@ def rename_playlist(playlist_id: int, data: PlaylistRename, user: User = Depends
     return {"message": "Playlist renamed"}
 
 @app.delete("/playlists/{playlist_id}")
-def delete_playlist(playlist_id: int, user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+def delete_playlist(playlist_id: int, user: Identity = Depends(get_current_identity), db: Session = Depends(get_db)):
     playlist = db.query(Playlist).filter(
         Playlist.id == playlist_id,
         Playlist.user_id == user.id
@@ -592,7 +783,7 @@ def delete_playlist(playlist_id: int, user: User = Depends(get_current_user), db
 def add_track_to_playlist(
     playlist_id: int,
     track: TrackData,
-    user: User = Depends(get_current_user),
+    user: Identity = Depends(get_current_identity),
     db: Session = Depends(get_db)
 ):
     playlist = db.query(Playlist).filter(
@@ -603,38 +794,19 @@ def add_track_to_playlist(
     if not playlist:
         raise HTTPException(status_code=404, detail="Playlist not found")
     
-    # Check if track already in playlist
-    existing = db.query(PlaylistTrack).filter(
-        PlaylistTrack.playlist_id == playlist_id,
-        PlaylistTrack.video_id == track.video_id
-    ).first()
-    
-    if existing:
-        return {"message": "Track already in playlist"}
-    
-    # Get next position
-    max_pos = db.query(PlaylistTrack).filter(
-        PlaylistTrack.playlist_id == playlist_id
-    ).count()
-    
-    pt = PlaylistTrack(
-        playlist_id=playlist_id,
-        video_id=track.video_id,
-        title=track.title,
-        uploader=track.uploader,
-        thumbnail=track.thumbnail,
-        duration=track.duration,
-        position=max_pos
-    )
-    db.add(pt)
+    inserted = add_to_library(db, PlaylistTrack, [
+        {"playlist_id": playlist_id, "position": _next_position(db, playlist_id), **track.dict()}
+    ])
     db.commit()
+    if not inserted:
+        return {"message": "Track already in playlist"}
     return {"message": "Track added to playlist"}
 
 @app.delete("/playlists/{playlist_id}/tracks/{video_id}")
 def remove_track_from_playlist(
     playlist_id: int,
     video_id: str,
-    user: User = Depends(get_current_user),
+    user: Identity = Depends(get_current_identity),
     db: Session = Depends(get_db)
 ):
     playlist = db.query(Playlist).filter(
@@ -656,6 +828,75 @@ def remove_track_from_playlist(
     
     return {"message": "Track removed from playlist"}
 
+@app.post("/playlists/{playlist_id}/tracks/batch")
+def add_tracks_to_playlist(
+    playlist_id: int,
+    req: TrackBatchRequest,
+    user: Identity = Depends(get_current_identity),
+    db: Session = Depends(get_db)
+):
+    _get_user_playlist(playlist_id, user, db)
+    tracks = _unique_tracks(req.tracks)
+    # Tracks already in the playlist are skipped, leaving harmless gaps in the positions
+    next_pos = _next_position(db, playlist_id)
+    added = add_to_library(db, PlaylistTrack, [
+        {"playlist_id": playlist_id, "position": next_pos + i, **t.dict()}
+        for i, t in enumerate(tracks)
+    ])
+    db.commit()
+    return {"added": added, "skipped": len(tracks) - added}
+
+@app.post("/playlists/{playlist_id}/tracks/batch/remove")
+def remove_tracks_from_playlist(
+    playlist_id: int,
+    req: VideoIdsRequest,
+    user: Identity = Depends(get_current_identity),
+    db: Session = Depends(get_db)
+):
+    _get_user_playlist(playlist_id, user, db)
+    video_ids = _unique_ids(req.video_ids)
+    removed = db.query(PlaylistTrack).filter(
+        PlaylistTrack.playlist_id == playlist_id,
+        PlaylistTrack.video_id.in_(video_ids)
+    ).delete(synchronize_session=False) if video_ids else 0
+    db.commit()
+    return {"removed": removed}
+
+@app.put("/playlists/{playlist_id}/tracks/order")
+def reorder_playlist_tracks(
+    playlist_id: int,
+    req: VideoIdsRequest,
+    user: Identity = Depends(get_current_identity),
+    db: Session = Depends(get_db)
+):
+    """Move the given tracks to the front in the given order; the rest keep their relative order after them."""
+    playlist = _get_user_playlist(playlist_id, user, db)
+    order = {video_id: i for i, video_id in enumerate(dict.fromkeys(req.video_ids))}
+    tracks = sorted(
+        playlist.tracks,
+        key=lambda t: (0, order[t.video_id]) if t.video_id in order else (1, t.position or 0)
+    )
+    for position, track in enumerate(tracks):
+        track.position = position
+    db.commit()
+    return {"tracks": [t.video_id for t in tracks]}
+
+# ============== Stats ==============
+
+@app.get("/stats")
+def get_stats(admin: Identity = Depends(get_admin_identity)):
+    return {
+        "youtube": youtube_service.cache_stats(),
+        "audio_cache": audio_cache.stats(),
+        "executors": executor_stats(),
+        "matching": track_matcher.stats(),
+        "prefetch": prefetch_service.stats(),
+        "database": {**db_settings(), "pool": engine.pool.status()},
+        "catalog": track_catalog.stats(),
+        # Counters above are per process; this tells workers apart
+        "worker": WORKER_ID
+    }
+
 # ============== Config ==============
 
 @app.get("/config")
@@ -663,4 +904,9 @@ def get_config():
     return CONFIG.client
 
 if __name__ == "__main__":
-    uvicorn.run("main:app", host=CONFIG.server.host, port=CONFIG.server.port, reload=True)
+    workers = CONFIG.server.workers
+    # uvicorn can only reload a single process
+    reload = CONFIG.server.reload and workers == 1
+    if CONFIG.server.reload and not reload:
+        print(f"[SERVER] Reload disabled: running {workers} workers")
+    uvicorn.run("main:app", host=CONFIG.server.host, port=CONFIG.server.port, reload=reload, workers=workers)
@@ -0,0 +1,319 @@
+import hashlib
+import json
+import mmap
+import os
+import re
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Optional, Tuple
+from core.config import CONFIG
+from core.executors import cache_pool, PRIORITY_INTERACTIVE
+
+try:
+    import fcntl
+except ImportError:  # Windows: a single worker process is the only supported mode there
+    fcntl = None
+
+CHUNK_SIZE = 128 * 1024
+# Temp files older than this are leftovers; younger ones may belong to another worker's download
+STALE_PART_AGE = 3600
+SERVER_DIR = Path(__file__).resolve().parent.parent
+RANGE_RE = re.compile(r"bytes=(\d*)-(\d*)")
+
+
+def parse_range(range_header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """
+    Resolve a Range header against a file of `size` bytes.
+    Returns (start, end) inclusive, or None when the range is unsatisfiable.
+    A missing header resolves to the whole file.
+    """
+    if not range_header:
+        return 0, size - 1
+
+    # Only the first range of a multi-range request is honoured
+    match = RANGE_RE.match(range_header.split(",")[0].strip())
+    if not match or (not match.group(1) and not match.group(2)):
+        return None
+
+    if not match.group(1):
+        # Suffix range: the last N bytes
+        length = int(match.group(2))
+        if length == 0:
+            return None
+        return max(size - length, 0), size - 1
+
+    start = int(match.group(1))
+    end = int(match.group(2)) if match.group(2) else size - 1
+    if start >= size or end < start:
+        return None
+    return start, min(end, size - 1)
+
+
+class AudioCacheWriter:
+    """
+    Tees upstream bytes into a temp file and publishes it on commit.
+    Writes and the commit run on the audio cache pool, never on the event loop.
+    """
+
+    def __init__(self, cache: "AudioCache", video_id: str, content_type: str, expected_size: Optional[int], priority: int):
+        self.cache = cache
+        self.video_id = video_id
+        self.content_type = content_type
+        self.expected_size = expected_size
+        self.priority = priority
+        self.written = 0
+        self.path = cache._path_for(video_id)
+        # Unique per writer: the proxy and a prefetch may tee the same track at once
+        self.tmp_path = self.path.with_name(f"{self.path.name}.{os.getpid()}.{uuid.uuid4().hex[:8]}.part")
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.file = open(self.tmp_path, "wb")
+
+    async def write(self, chunk: bytes):
+        await cache_pool.run(self.file.write, chunk, priority=self.priority)
+        self.written += len(chunk)
+
+    async def commit(self):
+        await cache_pool.run(self._commit, priority=self.priority)
+
+    def _commit(self):
+        self.file.close()
+        if self.written == 0 or (self.expected_size and self.written != self.expected_size):
+            print(f"[AUDIO CACHE] DEBUG: Discarding incomplete download for {self.video_id} ({self.written}/{self.expected_size})")
+            self._remove_tmp()
+            return
+        os.replace(self.tmp_path, self.path)
+        self.cache._add(self.video_id, self.written, self.content_type)
+
+    def abort(self):
+        if not self.file.closed:
+            self.file.close()
+        self._remove_tmp()
+
+    def _remove_tmp(self):
+        try:
+            os.remove(self.tmp_path)
+        except OSError:
+            pass
+
+
+class AudioCache:
+    def __init__(self):
+        self.enabled = CONFIG.audio_cache.enabled
+        self.max_bytes = CONFIG.audio_cache.max_bytes
+        root = Path(CONFIG.audio_cache.dir)
+        self.root = root if root.is_absolute() else SERVER_DIR / root
+
+        # key -> {'video_id', 'size', 'content_type'}, least recently used first
+        self.index = OrderedDict()
+        self.total_bytes = 0
+        # Size of the whole shared directory at the last eviction pass
+        self.disk_bytes = 0
+        self.lock = threading.Lock()
+
+        if self.enabled:
+            self.root.mkdir(parents=True, exist_ok=True)
+            self._load_index()
+
+    def _key(self, video_id: str) -> str:
+        return hashlib.sha1(video_id.encode("utf-8")).hexdigest()
+
+    def _path_for(self, video_id: str) -> Path:
+        key = self._key(video_id)
+        return self.root / key[:2] / f"{key}.audio"
+
+    def _load_index(self):
+        # Rebuild the LRU order from file mtimes so recency survives restarts
+        entries = []
+        for meta_path in self.root.glob("*/*.json"):
+            audio_path = meta_path.with_suffix(".audio")
+            try:
+                meta = json.loads(meta_path.read_text())
+                stat = audio_path.stat()
+            except (OSError, ValueError):
+                continue
+            if stat.st_size != meta.get("size"):
+                continue
+            entries.append((stat.st_mtime, meta_path.stem, meta))
+
+        for _, key, meta in sorted(entries, key=lambda e: e[0]):
+            self.index[key] = meta
+            self.total_bytes += meta["size"]
+
+        # Leftovers from interrupted downloads
+        now = time.time()
+        for part in self.root.glob("*/*.part"):
+            try:
+                if now - part.stat().st_mtime > STALE_PART_AGE:
+                    os.remove(part)
+            except OSError:
+                pass
+
+        print(f"[AUDIO CACHE] Loaded {len(self.index)} tracks ({self.total_bytes} bytes) from {self.root}")
+        self._evict()
+
+    def _load_entry(self, key: str) -> Optional[dict]:
+        """Read one track's metadata from disk, e.g. a file another worker just cached."""
+        meta_path = self.root / key[:2] / f"{key}.json"
+        try:
+            meta = json.loads(meta_path.read_text())
+            if meta_path.with_suffix(".audio").stat().st_size != meta.get("size"):
+                return None
+        except (OSError, ValueError):
+            return None
+        return meta
+
+    def lookup(self, video_id: str) -> Optional[dict]:
+        """Return {'path', 'size', 'content_type'} for a cached track and mark it recently used."""
+        if not self.enabled:
+            return None
+        key = self._key(video_id)
+        with self.lock:
+            meta = self.index.get(key)
+            if meta is not None:
+                self.index.move_to_end(key)
+
+        if meta is None:
+            # The index only knows this process's writes; other workers share the directory
+            meta = self._load_entry(key)
+            if meta is None:
+                return None
+            with self.lock:
+                if key not in self.index:
+                    self.index[key] = meta
+                    self.total_bytes += meta["size"]
+
+        path = self._path_for(video_id)
+        try:
+            os.utime(path)
+        except OSError:
+            with self.lock:
+                self._drop(key)
+            return None
+        return {"path": path, "size": meta["size"], "content_type": meta["content_type"]}
+
+    def open_writer(
+        self, video_id: str, content_type: str, expected_size: Optional[int], priority: int = PRIORITY_INTERACTIVE
+    ) -> Optional[AudioCacheWriter]:
+        if not self.enabled:
+            return None
+        if expected_size and expected_size > self.max_bytes:
+            return None
+        try:
+            return AudioCacheWriter(self, video_id, content_type, expected_size, priority)
+        except OSError as e:
+            print(f"[AUDIO CACHE] Could not open cache file for {video_id}: {e}")
+            return None
+
+    def iter_file(self, path: Path, start: int, end: int):
+        """Yield bytes [start, end] of a cached file through a read-only mmap."""
+        with open(path, "rb") as f:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                pos = start
+                while pos <= end:
+                    stop = min(pos + CHUNK_SIZE, end + 1)
+                    yield mm[pos:stop]
+                    pos = stop
+
+    def _add(self, video_id: str, size: int, content_type: str):
+        key = self._key(video_id)
+        meta = {"video_id": video_id, "size": size, "content_type": content_type}
+        self._path_for(video_id).with_suffix(".json").write_text(json.dumps(meta))
+        with self.lock:
+            if key in self.index:
+                self.total_bytes -= self.index[key]["size"]
+            self.index[key] = meta
+            self.index.move_to_end(key)
+            self.total_bytes += size
+        self._evict()
+        print(f"[AUDIO CACHE] DEBUG: Stored {video_id} ({size} bytes, total {self.total_bytes})")
+
+    @contextmanager
+    def _dir_lock(self):
+        """
+        Serializes eviction across every worker process sharing the directory.
+        Yields False instead of waiting while another process holds it.
+        """
+        if fcntl is None:
+            yield True
+            return
+        with open(self.root / ".lock", "a") as f:
+            try:
+                fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                yield False
+                return
+            try:
+                yield True
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _scan(self) -> list:
+        """(mtime, key, size) of every complete track on disk, whoever wrote it."""
+        entries = []
+        for audio_path in self.root.glob("*/*.audio"):
+            try:
+                stat = audio_path.stat()
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, audio_path.stem, stat.st_size))
+        return entries
+
+    def _evict(self):
+        """
+        Enforce max_bytes over the whole directory. Other workers write here too,
+        so the budget is checked against what is on disk, not this process's index;
+        lookups touch mtimes, which makes the oldest file the least recently used.
+        A pass already running in another worker is not waited for; the next
+        store checks the budget again.
+        """
+        with self._dir_lock() as locked:
+            if not locked:
+                return
+            entries = self._scan()
+            total = sum(size for _, _, size in entries)
+            evicted = []
+            for _, key, size in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                self._remove_files(key)
+                total -= size
+                evicted.append(key)
+            self.disk_bytes = total
+        if evicted:
+            with self.lock:
+                for key in evicted:
+                    self._forget(key)
+            print(f"[AUDIO CACHE] DEBUG: Evicted {len(evicted)} tracks, {total} bytes on disk")
+
+    def _forget(self, key: str):
+        meta = self.index.pop(key, None)
+        if meta is not None:
+            self.total_bytes -= meta["size"]
+
+    def _remove_files(self, key: str):
+        audio_path = self.root / key[:2] / f"{key}.audio"
+        for path in (audio_path, audio_path.with_suffix(".json")):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def _drop(self, key: str):
+        self._forget(key)
+        self._remove_files(key)
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {
+                "enabled": self.enabled,
+                "tracks": len(self.index),
+                "bytes": self.total_bytes,
+                "disk_bytes": self.disk_bytes,
+                "max_bytes": self.max_bytes
+            }
+
+audio_cache = AudioCache()
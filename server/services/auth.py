@@ -1,11 +1,16 @@
 import bcrypt
+import time
+from dataclasses import dataclass
 from jose import jwt, JWTError
 from datetime import datetime, timedelta
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from sqlalchemy import event
 from sqlalchemy.orm import Session
 from typing import Optional
-from database import get_db, User
+from core.cache import TTLCache
+from core.config import CONFIG
+from database import get_db, SessionLocal, User
 
 # Secret key for JWT - in production use environment variable
 SECRET_KEY = "mobify-secret-key-change-in-production-2024"
@@ -15,6 +20,29 @@ ACCESS_TOKEN_EXPIRE_DAYS = 30
 security = HTTPBearer(auto_error=False)
 
 
+@dataclass(frozen=True)
+class Identity:
+    """Who is calling, without the rest of the users row (Spotify tokens, password hash)."""
+    id: int
+    username: str
+
+
+# token -> user id, so a token's signature is checked once per cache lifetime
+token_cache = TTLCache(CONFIG.auth.identity_cache_size, default_ttl=CONFIG.auth.identity_cache_ttl)
+# user id -> Identity, dropped whenever the users row changes in this process
+identity_cache = TTLCache(CONFIG.auth.identity_cache_size, default_ttl=CONFIG.auth.identity_cache_ttl)
+
+
+def invalidate_user(user_id: int):
+    identity_cache.pop(user_id)
+
+
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def _user_changed(mapper, connection, target):
+    invalidate_user(target.id)
+
+
 def hash_password(password: str) -> str:
     """Hash a password using bcrypt"""
     return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
@@ -32,11 +60,8 @@ def create_access_token(user_id: int) -> str:
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
 
-def get_current_user(
-    credentials: HTTPAuthorizationCredentials = Depends(security),
-    db: Session = Depends(get_db)
-) -> User:
-    """Get the current user from JWT token"""
+def _decode_token(credentials: Optional[HTTPAuthorizationCredentials]) -> int:
+    """User id from a bearer token; decoded tokens are cached until they expire."""
     if credentials is None:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -44,15 +69,70 @@ def get_current_user(
         )
     
     token = credentials.credentials
+    user_id = token_cache.get(token)
+    if user_id is not None:
+        return user_id
+    
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         user_id = int(payload.get("sub"))
-    except (JWTError, ValueError):
+    except (JWTError, ValueError, TypeError):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid token"
         )
     
+    # Never keep a token past its own expiry
+    ttl = CONFIG.auth.identity_cache_ttl
+    if payload.get("exp"):
+        ttl = min(ttl, payload["exp"] - time.time())
+    token_cache.set(token, user_id, ttl=ttl)
+    return user_id
+
+
+def get_current_identity(credentials: HTTPAuthorizationCredentials = Depends(security)) -> Identity:
+    """
+    Lightweight alternative to get_current_user for endpoints that only need
+    the caller's id; served from memory without a DB session when cached.
+    """
+    user_id = _decode_token(credentials)
+    identity = identity_cache.get(user_id)
+    if identity is not None:
+        return identity
+    
+    db = SessionLocal()
+    try:
+        row = db.query(User.id, User.username).filter(User.id == user_id).first()
+    finally:
+        db.close()
+    if row is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="User not found"
+        )
+    
+    identity = Identity(id=row.id, username=row.username)
+    identity_cache.set(user_id, identity)
+    return identity
+
+
+def get_admin_identity(identity: Identity = Depends(get_current_identity)) -> Identity:
+    """get_current_identity restricted to the usernames listed in auth.admin_users."""
+    if identity.username not in CONFIG.auth.admin_users:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Admin access required"
+        )
+    return identity
+
+
+def get_current_user(
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    db: Session = Depends(get_db)
+) -> User:
+    """Get the current user from JWT token"""
+    user_id = _decode_token(credentials)
+    
     user = db.query(User).filter(User.id == user_id).first()
     if user is None:
         raise HTTPException(
@@ -72,8 +152,7 @@ def get_current_user_optional(
         return None
     
     try:
-        payload = jwt.decode(credentials.credentials, SECRET_KEY, algorithms=[ALGORITHM])
-        user_id = int(payload.get("sub"))
+        user_id = _decode_token(credentials)
         return db.query(User).filter(User.id == user_id).first()
     except:
         return None
@@ -0,0 +1,97 @@
+import re
+from typing import Dict, List, Optional
+from sqlalchemy import and_, func, or_, select, text
+from database import AsyncSessionLocal, SessionLocal, Track, upsert_tracks
+
+LOCAL_SEARCH_SQL = text("""
+    SELECT tracks.video_id, tracks.title, tracks.uploader, tracks.duration, tracks.thumbnail
+    FROM tracks_fts JOIN tracks ON tracks.video_id = tracks_fts.video_id
+    WHERE tracks_fts MATCH :match AND tracks.verified
+    ORDER BY tracks_fts.rank
+    LIMIT :limit OFFSET :offset
+""")
+
+
+def _search_terms(query: str) -> List[str]:
+    return re.findall(r"\w+", query.lower())
+
+
+class TrackCatalog:
+    """
+    Video metadata shared by every user's library and by the YouTube caches.
+    Search results, stream lookups and imports all write here, so a video's
+    title or size is stored once no matter how many libraries hold it.
+    """
+
+    def __init__(self):
+        # Whether the FTS5 index exists; looked up on first search
+        self.fts: Optional[bool] = None
+
+    def put(self, videos: List[Dict]):
+        """Upsert metadata for videos keyed by 'id', as YouTubeService returns them."""
+        rows = [{**v, 'video_id': v['id']} for v in videos if v.get('id')]
+        if not rows:
+            return
+        with SessionLocal() as db:
+            upsert_tracks(db, rows)
+            db.commit()
+
+    def iter_content_info(self, limit: int):
+        """(video_id, filesize, mime_type) for the most recently seen videos with a known size."""
+        with SessionLocal() as db:
+            rows = db.execute(
+                select(Track.video_id, Track.filesize, Track.mime_type)
+                .where(Track.filesize.is_not(None))
+                .order_by(Track.updated_at.desc())
+                .limit(limit)
+            ).all()
+        # Oldest first, so the most recent end up most recently used in the LRU
+        return list(reversed(rows))
+
+    async def search(self, query: str, limit: int, offset: int = 0) -> List[Dict]:
+        """
+        Catalog tracks whose title or uploader contains every word of `query`
+        (as a prefix), best match first, shaped like YouTube search results.
+        Only metadata that came from YouTube is searched, never a client's own.
+        """
+        terms = _search_terms(query)
+        if not terms:
+            return []
+        async with AsyncSessionLocal() as db:
+            if self.fts is None:
+                self.fts = db.bind.dialect.name == "sqlite" and await db.scalar(
+                    text("SELECT COUNT(*) FROM sqlite_master WHERE name = 'tracks_fts'")
+                ) > 0
+            if self.fts:
+                # Each term is quoted, so FTS operators typed by the user stay literal
+                match = " ".join(f'"{term}"*' for term in terms)
+                rows = (await db.execute(LOCAL_SEARCH_SQL, {"match": match, "limit": limit, "offset": offset})).all()
+            else:
+                rows = (await db.execute(
+                    select(Track.video_id, Track.title, Track.uploader, Track.duration, Track.thumbnail)
+                    .where(Track.verified.is_(True))
+                    .where(and_(*[
+                        or_(Track.title.icontains(term, autoescape=True), Track.uploader.icontains(term, autoescape=True))
+                        for term in terms
+                    ]))
+                    .order_by(Track.title)
+                    .limit(limit)
+                    .offset(offset)
+                )).all()
+        return [
+            {
+                'id': video_id,
+                'title': title,
+                'uploader': uploader,
+                'duration': duration,
+                'thumbnail': thumbnail,
+                'url': f"https://youtube.com/watch?v={video_id}"
+            }
+            for video_id, title, uploader, duration, thumbnail in rows
+        ]
+
+    def stats(self) -> dict:
+        with SessionLocal() as db:
+            return {"tracks": db.scalar(select(func.count()).select_from(Track))}
+
+track_catalog = TrackCatalog()
@@ -0,0 +1,60 @@
+import httpx
+from typing import Optional
+from core.config import CONFIG, HTTPClientConfig
+
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
+
+
+class HTTPClientPool:
+    """
+    App-lifetime httpx client for an upstream service.
+    Keeps TLS sessions alive across requests (googlevideo plays and seeks, Spotify pages).
+    """
+
+    def __init__(self, config: HTTPClientConfig, base_url: str = ""):
+        # Each upstream has its own limits and timeouts
+        self.config = config
+        self.base_url = base_url
+        self._client: Optional[httpx.AsyncClient] = None
+
+    def _build(self) -> httpx.AsyncClient:
+        cfg = self.config
+        http2 = cfg.http2
+        if http2:
+            try:
+                import h2  # noqa: F401
+            except ImportError:
+                print("[HTTP] h2 is not installed, falling back to HTTP/1.1 (pip install 'httpx[http2]')")
+                http2 = False
+
+        return httpx.AsyncClient(
+            http2=http2,
+            limits=httpx.Limits(
+                max_connections=cfg.max_connections,
+                max_keepalive_connections=cfg.max_keepalive_connections,
+                keepalive_expiry=cfg.keepalive_expiry
+            ),
+            timeout=httpx.Timeout(
+                connect=cfg.connect_timeout,
+                read=cfg.read_timeout,
+                write=cfg.write_timeout,
+                pool=cfg.pool_timeout
+            ),
+            headers={"User-Agent": USER_AGENT},
+            base_url=self.base_url,
+            follow_redirects=True
+        )
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            self._client = self._build()
+        return self._client
+
+    async def close(self):
+        if self._client is not None and not self._client.is_closed:
+            await self._client.aclose()
+        self._client = None
+
+audio_http = HTTPClientPool(CONFIG.audio_proxy)
+spotify_http = HTTPClientPool(CONFIG.spotify_http, "https://api.spotify.com/v1")
@@ -0,0 +1,316 @@
+import asyncio
+import json
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+from sqlalchemy import or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from core.config import CONFIG
+from core.executors import import_pool, PRIORITY_BATCH
+from core.persistent_cache import WORKER_ID, metadata_store
+from database import AsyncSessionLocal, add_to_library_async, ImportJob, LikedSong, Playlist, PlaylistTrack
+from services.matcher import track_matcher
+from services.youtube import youtube_service
+
+TERMINAL_STATUSES = ("completed", "failed", "cancelled")
+# Matched tracks and progress are committed together every CHECKPOINT_SIZE tracks
+CHECKPOINT_SIZE = 25
+# Seconds a worker's claim on a job lasts without renewal; after that another worker may take over
+LEASE_TTL = 60
+
+
+def job_to_dict(job: ImportJob) -> dict:
+    return {
+        "job_id": job.id,
+        "kind": job.kind,
+        "name": job.name,
+        "status": job.status,
+        "playlist_id": job.playlist_id,
+        "total": job.total,
+        "processed": job.processed,
+        "imported_count": job.imported_count,
+        "error": job.error
+    }
+
+
+class ImportJobService:
+    """
+    Runs Spotify and YouTube playlist imports as persisted background jobs.
+    Progress is checkpointed in the same commit as the imported rows,
+    so a restarted server resumes each job where it stopped.
+    With several workers, a job runs only in the worker holding its lease.
+    """
+
+    def __init__(self):
+        # job_id -> asyncio.Task for jobs running in this process
+        self.tasks: Dict[str, asyncio.Task] = {}
+        self.maintenance_task: Optional[asyncio.Task] = None
+        self.worker_id = WORKER_ID
+
+    async def create(self, db: AsyncSession, user_id: int, kind: str, name: str, tracks: List[Dict], playlist_id: Optional[int] = None) -> ImportJob:
+        return await self._enqueue(db, ImportJob(
+            id=uuid.uuid4().hex,
+            user_id=user_id,
+            kind=kind,
+            name=name,
+            playlist_id=playlist_id,
+            source=json.dumps(tracks),
+            total=len(tracks)
+        ))
+
+    async def create_youtube(self, db: AsyncSession, user_id: int, name: str, url: str, playlist_id: int) -> ImportJob:
+        """Stream a YouTube playlist into `playlist_id`; the total grows as pages arrive."""
+        return await self._enqueue(db, ImportJob(
+            id=uuid.uuid4().hex,
+            user_id=user_id,
+            kind="youtube_url",
+            name=name,
+            playlist_id=playlist_id,
+            source=url,
+            total=0
+        ))
+
+    async def _enqueue(self, db: AsyncSession, job: ImportJob) -> ImportJob:
+        db.add(job)
+        await db.commit()
+        self.start(job.id)
+        return job
+
+    def start(self, job_id: str):
+        if job_id in self.tasks:
+            return
+        self.tasks[job_id] = asyncio.create_task(self._run(job_id))
+
+    async def resume_pending(self):
+        """Restart unfinished jobs that no live worker is running."""
+        async with AsyncSessionLocal() as db:
+            pending = (await db.execute(
+                select(ImportJob.id).where(
+                    ImportJob.status.in_(("queued", "running")),
+                    or_(ImportJob.worker_id.is_(None), ImportJob.lease_expires_at < datetime.utcnow())
+                )
+            )).scalars().all()
+        for job_id in pending:
+            if job_id not in self.tasks:
+                print(f"[IMPORT] Resuming job {job_id}")
+                self.start(job_id)
+
+    def start_maintenance(self):
+        self.maintenance_task = asyncio.create_task(self._maintain())
+
+    async def shutdown(self):
+        """Stop this worker's jobs and give up their leases so the next worker resumes them at once."""
+        tasks = list(self.tasks.values())
+        if self.maintenance_task:
+            tasks.append(self.maintenance_task)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _maintain(self):
+        # Renew leases well before they lapse, then adopt jobs whose worker went away.
+        # The same loop sweeps expired rows out of cache.db, which nothing else deletes.
+        last_purge = time.monotonic()
+        while True:
+            await asyncio.sleep(LEASE_TTL / 3)
+            if time.monotonic() - last_purge >= CONFIG.metadata_cache.purge_interval:
+                last_purge = time.monotonic()
+                try:
+                    await import_pool.run(metadata_store.purge_expired, priority=PRIORITY_BATCH)
+                except Exception as e:
+                    print(f"[IMPORT] Cache purge failed: {e}")
+            try:
+                if self.tasks:
+                    async with AsyncSessionLocal() as db:
+                        await db.execute(
+                            update(ImportJob)
+                            .where(ImportJob.id.in_(list(self.tasks)), ImportJob.worker_id == self.worker_id)
+                            .values(lease_expires_at=datetime.utcnow() + timedelta(seconds=LEASE_TTL))
+                        )
+                        await db.commit()
+                await self.resume_pending()
+            except Exception as e:
+                print(f"[IMPORT] Lease maintenance failed: {e}")
+
+    async def _claim(self, db: AsyncSession, job_id: str) -> bool:
+        now = datetime.utcnow()
+        result = await db.execute(
+            update(ImportJob)
+            .where(
+                ImportJob.id == job_id,
+                or_(ImportJob.worker_id.is_(None), ImportJob.worker_id == self.worker_id, ImportJob.lease_expires_at < now)
+            )
+            .values(worker_id=self.worker_id, lease_expires_at=now + timedelta(seconds=LEASE_TTL))
+            .execution_options(synchronize_session=False)
+        )
+        await db.commit()
+        return result.rowcount > 0
+
+    async def _release(self, job_id: str):
+        async with AsyncSessionLocal() as db:
+            await db.execute(
+                update(ImportJob)
+                .where(ImportJob.id == job_id, ImportJob.worker_id == self.worker_id)
+                .values(worker_id=None, lease_expires_at=None)
+                .execution_options(synchronize_session=False)
+            )
+            await db.commit()
+
+    async def cancel(self, db: AsyncSession, job: ImportJob):
+        if job.status in TERMINAL_STATUSES:
+            return
+        job.status = "cancelled"
+        job.updated_at = datetime.utcnow()
+        await db.commit()
+        task = self.tasks.pop(job.id, None)
+        if task:
+            task.cancel()
+
+    async def resume(self, db: AsyncSession, job: ImportJob):
+        """Continue a failed or cancelled job from its last checkpoint."""
+        if job.status not in ("failed", "cancelled"):
+            return
+        job.status = "queued"
+        job.error = None
+        job.updated_at = datetime.utcnow()
+        await db.commit()
+        self.start(job.id)
+
+    async def get_status(self, job_id: str) -> Optional[dict]:
+        async with AsyncSessionLocal() as db:
+            job = await db.get(ImportJob, job_id)
+            return job_to_dict(job) if job else None
+
+    async def _store(self, db: AsyncSession, job: ImportJob, start: int, matches: List[Optional[Dict]]) -> int:
+        """Insert one checkpoint's matched tracks with a single executemany; returns how many were new."""
+        rows = []
+        for offset, yt_track in enumerate(matches):
+            if not yt_track:
+                continue
+            row = {
+                "video_id": yt_track['id'],
+                "title": yt_track['title'],
+                "uploader": yt_track['uploader'],
+                "thumbnail": yt_track['thumbnail'],
+                "duration": yt_track['duration']
+            }
+            if job.kind == "spotify_liked":
+                row["user_id"] = job.user_id
+            else:
+                row.update(playlist_id=job.playlist_id, position=start + offset)
+            rows.append(row)
+        # Matched metadata comes from YouTube search, so it may refresh the catalog
+        return await add_to_library_async(db, LikedSong if job.kind == "spotify_liked" else PlaylistTrack, rows, overwrite=True)
+
+    async def _should_stop(self, db: AsyncSession, job: ImportJob) -> bool:
+        """True once the job was cancelled through the API or its target playlist was deleted."""
+        await db.refresh(job)
+        if job.status == "cancelled":
+            return True
+        if job.kind != "spotify_liked" and (job.playlist_id is None or await db.get(Playlist, job.playlist_id) is None):
+            job.status = "cancelled"
+            job.error = "Playlist was deleted"
+            await db.commit()
+            return True
+        return False
+
+    async def _run_matching(self, db: AsyncSession, job: ImportJob) -> bool:
+        tracks = json.loads(job.source)
+        for start in range(job.processed, job.total, CHECKPOINT_SIZE):
+            batch = tracks[start:start + CHECKPOINT_SIZE]
+            matches = await track_matcher.match_all(batch)
+            if await self._should_stop(db, job):
+                return False
+
+            job.imported_count += await self._store(db, job, start, matches)
+            job.processed = start + len(batch)
+            job.updated_at = datetime.utcnow()
+            await db.commit()
+        return True
+
+    async def _run_youtube(self, db: AsyncSession, job: ImportJob) -> bool:
+        # Each page is stored as it arrives. After a restart the pages are read
+        # again and entries below the checkpoint are skipped.
+        seen = 0
+        async for page in youtube_service.iter_playlist_pages(job.source):
+            start = seen
+            seen += len(page)
+            if seen <= job.processed:
+                continue
+            if await self._should_stop(db, job):
+                return False
+
+            skip = max(job.processed - start, 0)
+            # Playlists may repeat a video; the unique index keeps the first occurrence.
+            # Page metadata comes from YouTube, so it may refresh the catalog.
+            job.imported_count += await add_to_library_async(db, PlaylistTrack, [
+                {
+                    "playlist_id": job.playlist_id,
+                    "position": start + offset,
+                    "video_id": track['id'],
+                    "title": track['title'],
+                    "uploader": track['uploader'],
+                    "thumbnail": track['thumbnail'],
+                    "duration": track['duration']
+                }
+                for offset, track in enumerate(page[skip:], skip)
+            ], overwrite=True)
+            job.processed = job.total = seen
+            job.updated_at = datetime.utcnow()
+            await db.commit()
+
+        if seen == 0:
+            raise ValueError("Could not fetch tracks from YouTube URL or playlist is empty/private")
+        return True
+
+    async def _run(self, job_id: str):
+        claimed = False
+        async with AsyncSessionLocal() as db:
+            try:
+                job = await db.get(ImportJob, job_id)
+                if job is None or job.status in TERMINAL_STATUSES:
+                    return
+                if not await self._claim(db, job_id):
+                    print(f"[IMPORT] DEBUG: Job {job_id} is running in another worker")
+                    return
+                claimed = True
+
+                job.status = "running"
+                job.updated_at = datetime.utcnow()
+                await db.commit()
+
+                print(f"[IMPORT] DEBUG: Job {job_id} ({job.kind}) at {job.processed}/{job.total}")
+                if job.kind == "youtube_url":
+                    finished = await self._run_youtube(db, job)
+                else:
+                    finished = await self._run_matching(db, job)
+                if not finished:
+                    return
+
+                job.status = "completed"
+                job.updated_at = datetime.utcnow()
+                await db.commit()
+                print(f"[IMPORT] DEBUG: Job {job_id} complete. Imported {job.imported_count}/{job.total} tracks.")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"[ERROR] Import job {job_id} failed: {e}")
+                await db.rollback()
+                job = await db.get(ImportJob, job_id)
+                if job:
+                    job.status = "failed"
+                    job.error = str(e)
+                    job.updated_at = datetime.utcnow()
+                    await db.commit()
+            finally:
+                if self.tasks.get(job_id) is asyncio.current_task():
+                    del self.tasks[job_id]
+                # A resumed run of the same job may already hold the lease again
+                if claimed and job_id not in self.tasks:
+                    try:
+                        await self._release(job_id)
+                    except Exception as e:
+                        print(f"[IMPORT] Could not release job {job_id}: {e}")
+
+import_jobs = ImportJobService()
@@ -1,31 +1,108 @@
+import re
 from syncedlyrics import search
-import asyncio
+from core.cache import SingleFlight
+from core.config import CONFIG
+from core.executors import lyrics_pool, PRIORITY_INTERACTIVE
+from core.persistent_cache import metadata_store
+
+LRC_TIMESTAMP = re.compile(r'\[(\d{1,3}):(\d{2})(?:[.:](\d{1,3}))?\]')
+
+
+def parse_lrc(lrc: str) -> list:
+    """
+    Parse LRC text into [[ms, text], ...] sorted by time.
+    Lines with several timestamps are repeated; metadata tags ([ar:], [ti:]) are skipped.
+    Lyrics without any timestamps come back as [[None, text], ...].
+    """
+    synced = []
+    plain = []
+    for raw in lrc.splitlines():
+        stamps = []
+        pos = 0
+        while True:
+            match = LRC_TIMESTAMP.match(raw, pos)
+            if not match:
+                break
+            minutes, seconds, fraction = match.groups()
+            # .5 / .50 / .500 are all half a second
+            ms = int((fraction or "0").ljust(3, "0")[:3])
+            stamps.append(int(minutes) * 60000 + int(seconds) * 1000 + ms)
+            pos = match.end()
+
+        text = raw[pos:].strip()
+        if stamps:
+            if text:
+                synced.extend([ms, text] for ms in stamps)
+        elif text and not re.match(r'^\[[a-zA-Z]+:.*\]$', text):
+            plain.append([None, text])
+
+    if synced:
+        return sorted(synced, key=lambda line: line[0])
+    return plain
+
 
 class LyricsService:
+    def __init__(self):
+        self.flight = SingleFlight()
+
     def _clean_query(self, query: str) -> str:
         # Remove common garbage that breaks sensitive search
-        import re
         query = re.sub(r'\(feat\..*?\)', '', query, flags=re.IGNORECASE)
         query = re.sub(r'\(official audio\)', '', query, flags=re.IGNORECASE)
         query = re.sub(r'\(official video\)', '', query, flags=re.IGNORECASE)
         query = re.sub(r'\[.*?\]', '', query) # Remove brackets like [HQ]
         return query.strip()
 
-    async def get_lyrics(self, query: str):
+    def _cache_key(self, clean_q: str) -> str:
+        return " ".join(clean_q.lower().split())
+
+    async def get_lyrics(self, query: str, priority: int = PRIORITY_INTERACTIVE):
         """
         Search for synced lyrics using syncedlyrics.
         Returns the LRC string or None if not found.
         """
+        lrc, _ = await self._lookup(query, priority)
+        return lrc
+
+    async def get_lines(self, query: str, priority: int = PRIORITY_INTERACTIVE):
+        """
+        Same lookup as get_lyrics, returned as [[ms, text], ...] parsed once at cache-fill time.
+        ms is None for plain (unsynced) lyrics. Returns None if not found.
+        """
+        _, lines = await self._lookup(query, priority)
+        return lines
+
+    async def _lookup(self, query: str, priority: int):
         try:
             clean_q = self._clean_query(query)
-            print(f"[LYRICS] Validated search query: '{clean_q}' (Original: '{query}')")
-            
-            loop = asyncio.get_event_loop()
-            # Run blocking search in executor
-            lrc = await loop.run_in_executor(None, lambda: search(clean_q))
-            return lrc
+            key = self._cache_key(clean_q)
+
+            cached = await lyrics_pool.run(metadata_store.get_lyrics, key, priority=priority)
+            if cached is not None:
+                lrc, lines = cached
+                print(f"[LYRICS] Cache {'HIT' if lrc else 'negative HIT'} for '{clean_q}'")
+                if lrc and lines is None:
+                    # Entry cached before lines were stored
+                    lines = parse_lrc(lrc)
+                    await lyrics_pool.run(metadata_store.put_lyrics, key, lrc, lines, None, priority=priority)
+                return lrc, lines
+
+            # Listeners of the same song share one provider lookup
+            return await self.flight.do(key, lambda: self._fetch(key, clean_q, query, priority))
         except Exception as e:
             print(f"[ERROR] Lyrics search failed: {e}")
-            return None
+            return None, None
+
+    async def _fetch(self, key: str, clean_q: str, query: str, priority: int):
+        print(f"[LYRICS] Validated search query: '{clean_q}' (Original: '{query}')")
+        
+        # Run blocking search on the lyrics pool
+        lrc = await lyrics_pool.run(search, clean_q, priority=priority)
+        lines = parse_lrc(lrc) if lrc else None
+
+        # Misses are remembered for a while; provider errors raise and are not cached
+        ttl = None if lrc else CONFIG.metadata_cache.lyrics_miss_ttl
+        await lyrics_pool.run(metadata_store.put_lyrics, key, lrc or None, lines, ttl, priority=priority)
+        return lrc, lines
 
 lyrics_service = LyricsService()
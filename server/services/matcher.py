@@ -0,0 +1,182 @@
+import asyncio
+import re
+import time
+from datetime import datetime
+from typing import Dict, List, Optional
+from core.config import CONFIG
+from core.executors import PRIORITY_BATCH
+from sqlalchemy import select
+from database import AsyncSessionLocal, upsert_async, upsert_tracks_async, TrackMatch
+from services.youtube import youtube_service
+
+
+def _normalize(text: Optional[str]) -> str:
+    text = re.sub(r'\((feat|ft)\.?[^)]*\)', ' ', (text or '').lower())
+    return " ".join(re.sub(r'[^\w]+', ' ', text).split())
+
+
+def match_keys(track: Dict) -> List[str]:
+    """Cache keys for a source track, most specific first."""
+    keys = []
+    if track.get('id'):
+        keys.append(f"spotify:{track['id']}")
+    keys.append(f"meta:{_normalize(track['title'])}|{_normalize(track['artist'])}")
+    return keys
+
+
+def _is_throttled(error: Exception) -> bool:
+    code = getattr(error, 'code', None) or getattr(error, 'status', None)
+    if code == 429:
+        return True
+    text = str(error).lower()
+    return "429" in text or "too many requests" in text or "rate limit" in text
+
+
+# Seconds two recordings may differ by and still share a title/artist match
+DURATION_TOLERANCE = 5
+
+
+class AdaptiveLimiter:
+    """
+    Concurrency limit that grows by about one per full window of successes
+    and halves on throttling (AIMD), with an exponential pause after each throttle.
+    """
+
+    def __init__(self, initial: int, maximum: int, backoff_base: float, backoff_max: float):
+        self.limit = float(initial)
+        self.maximum = maximum
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.active = 0
+        self.strikes = 0
+        self.paused_until = 0.0
+        self.throttled = 0
+        self._cond = asyncio.Condition()
+
+    async def acquire(self):
+        async with self._cond:
+            await self._cond.wait_for(lambda: self.active < int(self.limit))
+            self.active += 1
+        delay = self.paused_until - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    async def release(self, throttled: bool = False):
+        async with self._cond:
+            self.active -= 1
+            if throttled:
+                self.throttled += 1
+                self.strikes += 1
+                self.limit = max(1.0, self.limit / 2)
+                pause = min(self.backoff_base * 2 ** (self.strikes - 1), self.backoff_max)
+                self.paused_until = max(self.paused_until, time.monotonic() + pause)
+                print(f"[MATCH] Throttled by YouTube, concurrency -> {int(self.limit)}, pausing {pause:.0f}s")
+            else:
+                self.strikes = 0
+                self.limit = min(float(self.maximum), self.limit + 1.0 / max(self.limit, 1.0))
+            self._cond.notify_all()
+
+    def stats(self) -> dict:
+        return {
+            "limit": int(self.limit),
+            "active": self.active,
+            "throttled": self.throttled
+        }
+
+
+class TrackMatcher:
+    """Shared Spotify -> YouTube matching engine used by every import path."""
+
+    def __init__(self):
+        cfg = CONFIG.matching
+        self.max_retries = cfg.max_retries
+        # One limiter for the whole process: all imports share YouTube's patience
+        self.limiter = AdaptiveLimiter(cfg.initial_concurrency, cfg.max_concurrency, cfg.backoff_base, cfg.backoff_max)
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    async def _lookup_cached(self, tracks: List[Dict]) -> List[Optional[Dict]]:
+        track_keys = [match_keys(track) for track in tracks]
+        all_keys = {key for keys in track_keys for key in keys}
+        async with AsyncSessionLocal() as db:
+            found_rows = (await db.execute(select(TrackMatch).where(TrackMatch.key.in_(all_keys)))).scalars().all()
+        rows = {m.key: m for m in found_rows}
+
+        results = []
+        for track, keys in zip(tracks, track_keys):
+            found = None
+            for key in keys:
+                row = rows.get(key)
+                if row is None:
+                    continue
+                # Title/artist keys only count when the lengths roughly agree
+                duration = track.get('duration_seconds')
+                if key.startswith("meta:") and duration and row.source_duration and abs(duration - row.source_duration) > DURATION_TOLERANCE:
+                    continue
+                found = {
+                    'id': row.video_id,
+                    'title': row.track.title,
+                    'uploader': row.track.uploader,
+                    'thumbnail': row.track.thumbnail,
+                    'duration': row.track.duration
+                }
+                break
+            results.append(found)
+        return results
+
+    async def _store_matches(self, matched: List[tuple]):
+        if not matched:
+            return
+        now = datetime.utcnow()
+        rows = [
+            {"key": key, "source_duration": track.get('duration_seconds'), "video_id": yt_track['id'], "created_at": now}
+            for track, yt_track in matched
+            for key in match_keys(track)
+        ]
+        async with AsyncSessionLocal() as db:
+            # Metadata goes to the catalog; the match itself only records the video_id.
+            # An upsert, because another import may store the same key at the same time
+            await upsert_tracks_async(db, [{**yt_track, 'video_id': yt_track['id']} for _, yt_track in matched])
+            await upsert_async(db, TrackMatch, rows, ["key"])
+            await db.commit()
+
+    async def match(self, track: Dict) -> Optional[Dict]:
+        query = f"{track['title']} {track['artist']}"
+        for attempt in range(self.max_retries + 1):
+            await self.limiter.acquire()
+            throttled = False
+            try:
+                search_results = await youtube_service.search(query, limit=1, priority=PRIORITY_BATCH, raise_errors=True)
+                return search_results[0] if search_results else None
+            except Exception as e:
+                throttled = _is_throttled(e)
+                if not throttled:
+                    print(f"[MATCH] Search failed for '{query}': {e}")
+                    return None
+            finally:
+                await self.limiter.release(throttled)
+        print(f"[MATCH] Giving up on '{query}' after {self.max_retries} retries")
+        return None
+
+    async def match_all(self, tracks: List[Dict]) -> List[Optional[Dict]]:
+        """Match tracks concurrently; results line up with `tracks` by index."""
+        results = await self._lookup_cached(tracks)
+        misses = [i for i, found in enumerate(results) if found is None]
+        self.cache_hits += len(tracks) - len(misses)
+        self.cache_misses += len(misses)
+
+        searched = await asyncio.gather(*[self.match(tracks[i]) for i in misses])
+        for i, yt_track in zip(misses, searched):
+            results[i] = yt_track
+
+        await self._store_matches([(tracks[i], yt_track) for i, yt_track in zip(misses, searched) if yt_track])
+        return results
+
+    def stats(self) -> dict:
+        return {
+            **self.limiter.stats(),
+            "cache_hits": self.cache_hits,
+            "cache_misses": self.cache_misses
+        }
+
+track_matcher = TrackMatcher()
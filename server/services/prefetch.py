@@ -0,0 +1,97 @@
+import asyncio
+from typing import Dict, List
+from core.cache import SingleFlight
+from core.config import CONFIG
+from core.executors import PRIORITY_BATCH
+from services.audio_cache import audio_cache
+from services.http_client import audio_http
+from services.lyrics import lyrics_service
+from services.youtube import youtube_service, STALE_STREAM_STATUSES
+
+
+class PrefetchService:
+    """
+    Warms stream resolution, lyrics and optionally the audio cache for the
+    next tracks in a listener's queue. Everything runs at batch priority so
+    the track that is actually playing always goes first.
+    """
+
+    def __init__(self):
+        # video_id -> task; also keeps references so tasks are not garbage collected mid-flight
+        self.tasks: Dict[str, asyncio.Task] = {}
+        self.audio_flight = SingleFlight()
+        self.audio_semaphore = asyncio.Semaphore(CONFIG.prefetch.audio_concurrency)
+        self.scheduled = 0
+        self.dropped = 0
+
+    def schedule(self, tracks: List[Dict], audio: bool = True) -> int:
+        scheduled = 0
+        for track in tracks[:CONFIG.prefetch.max_tracks]:
+            video_id = track['video_id']
+            # A track already pending is not queued twice, and a full backlog drops new work
+            if video_id in self.tasks:
+                continue
+            if len(self.tasks) >= CONFIG.prefetch.max_pending:
+                self.dropped += 1
+                continue
+            task = asyncio.create_task(self._warm(track, audio and CONFIG.prefetch.audio))
+            self.tasks[video_id] = task
+            task.add_done_callback(lambda _, video_id=video_id: self.tasks.pop(video_id, None))
+            scheduled += 1
+        self.scheduled += scheduled
+        return scheduled
+
+    async def _warm(self, track: Dict, audio: bool):
+        video_id = track['video_id']
+        try:
+            lyrics_query = f"{track.get('title', '')} {track.get('uploader', '')}".strip()
+            jobs = [youtube_service.get_stream_url(video_id, priority=PRIORITY_BATCH)]
+            if lyrics_query:
+                jobs.append(lyrics_service.get_lines(lyrics_query, priority=PRIORITY_BATCH))
+            await asyncio.gather(*jobs)
+
+            if audio and audio_cache.enabled and not audio_cache.lookup(video_id):
+                await self.audio_flight.do(video_id, lambda: self._warm_audio(video_id))
+        except Exception as e:
+            print(f"[PREFETCH] Failed to warm {video_id}: {e}")
+
+    async def _warm_audio(self, video_id: str):
+        async with self.audio_semaphore:
+            if audio_cache.lookup(video_id):
+                return
+            for _ in range(2):
+                stream_data = await youtube_service.get_stream_url(video_id, priority=PRIORITY_BATCH)
+                status = await self._download(video_id, stream_data)
+                if status not in STALE_STREAM_STATUSES:
+                    return
+                # googlevideo rejected the cached URL: drop it and extract once more
+                await youtube_service.invalidate_stream(video_id)
+
+    async def _download(self, video_id: str, stream_data: Dict) -> int:
+        """Stream the whole file into the audio cache; returns the upstream status."""
+        async with audio_http.client.stream("GET", stream_data['stream_url']) as r:
+            if r.status_code != 200:
+                return r.status_code
+            size = r.headers.get("Content-Length")
+            writer = audio_cache.open_writer(
+                video_id,
+                r.headers.get("Content-Type") or stream_data.get('mime_type') or "audio/mpeg",
+                int(size) if size and size.isdigit() else None,
+                priority=PRIORITY_BATCH
+            )
+            if writer is None:
+                return r.status_code
+            try:
+                async for chunk in r.aiter_bytes(chunk_size=128*1024):
+                    await writer.write(chunk)
+            except BaseException:
+                writer.abort()
+                raise
+            await writer.commit()
+            print(f"[PREFETCH] DEBUG: Cached audio for {video_id}")
+            return r.status_code
+
+    def stats(self) -> dict:
+        return {"scheduled": self.scheduled, "dropped": self.dropped, "running": len(self.tasks)}
+
+prefetch_service = PrefetchService()
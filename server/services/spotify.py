@@ -1,9 +1,35 @@
-import spotipy
+import asyncio
 from spotipy.oauth2 import SpotifyOAuth
+from sqlalchemy import update
 from core.config import CONFIG
+from database import AsyncSessionLocal, User
+from services.http_client import spotify_http
 import httpx
 import time
 
+TOKEN_URL = "https://accounts.spotify.com/api/token"
+# Refresh this many seconds before Spotify says the access token expires
+TOKEN_REFRESH_MARGIN = 60
+
+
+class SpotifyError(Exception):
+    def __init__(self, status_code: int, message: str):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class SpotifyCredentials:
+    """A user's Spotify tokens for the length of one request or import."""
+
+    def __init__(self, user: User):
+        self.user_id = user.id
+        self.access_token = user.spotify_access_token
+        self.refresh_token = user.spotify_refresh_token
+        self.expiry = user.spotify_token_expiry or 0
+        # Parallel page fetches that all hit 401 share one refresh
+        self.lock = asyncio.Lock()
+
+
 class SpotifyService:
     def __init__(self):
         self.client_id = CONFIG.spotify.client_id
@@ -78,14 +104,95 @@ class SpotifyService:
     def get_tokens(self, code):
         return self.get_auth_manager().get_access_token(code)
 
-    def get_client(self, access_token):
-        return spotipy.Spotify(auth=access_token)
+    # ---------- Web API ----------
+
+    async def _refresh(self, creds: SpotifyCredentials, stale_token: str):
+        """Swap in a new access token and store it on the user row."""
+        async with creds.lock:
+            if creds.access_token != stale_token:
+                # Another page already refreshed while we waited
+                return
+            if not creds.refresh_token:
+                raise SpotifyError(401, "Spotify session expired, please reconnect")
+
+            response = await spotify_http.client.post(
+                TOKEN_URL,
+                data={"grant_type": "refresh_token", "refresh_token": creds.refresh_token},
+                auth=(self.client_id, self.client_secret)
+            )
+            if response.status_code != 200:
+                print(f"[SPOTIFY] Token refresh failed for user {creds.user_id}: {response.status_code} {response.text}")
+                raise SpotifyError(401, "Spotify session expired, please reconnect")
 
-    def get_user_playlists(self, access_token):
-        sp = self.get_client(access_token)
-        results = sp.current_user_playlists()
+            token_info = response.json()
+            creds.access_token = token_info['access_token']
+            # Spotify only sometimes rotates the refresh token
+            creds.refresh_token = token_info.get('refresh_token') or creds.refresh_token
+            creds.expiry = int(time.time() + token_info['expires_in'])
+
+            async with AsyncSessionLocal() as db:
+                await db.execute(
+                    update(User).where(User.id == creds.user_id).values(
+                        spotify_access_token=creds.access_token,
+                        spotify_refresh_token=creds.refresh_token,
+                        spotify_token_expiry=creds.expiry
+                    )
+                )
+                await db.commit()
+            print(f"[SPOTIFY] DEBUG: Refreshed access token for user {creds.user_id}")
+
+    async def _get(self, creds: SpotifyCredentials, path: str, params: dict = None) -> dict:
+        """GET a Web API path, refreshing the token on 401 and honouring 429 Retry-After."""
+        cfg = CONFIG.spotify
+        if creds.expiry and creds.expiry - TOKEN_REFRESH_MARGIN < time.time():
+            await self._refresh(creds, creds.access_token)
+
+        refreshed = False
+        for attempt in range(cfg.max_retries + 1):
+            token = creds.access_token
+            response = await spotify_http.client.get(path, params=params, headers={"Authorization": f"Bearer {token}"})
+
+            if response.status_code == 200:
+                return response.json()
+            if response.status_code == 401 and not refreshed:
+                await self._refresh(creds, token)
+                refreshed = True
+                continue
+            if response.status_code == 429 or response.status_code >= 500:
+                retry_after = int(response.headers.get("Retry-After", 2 ** attempt))
+                if attempt < cfg.max_retries and retry_after <= cfg.max_retry_after:
+                    print(f"[SPOTIFY] {response.status_code} on {path}, retrying in {retry_after}s")
+                    await asyncio.sleep(retry_after)
+                    continue
+            raise SpotifyError(response.status_code, f"Spotify API error {response.status_code}: {response.text[:200]}")
+        raise SpotifyError(502, f"Spotify API kept failing for {path}")
+
+    async def _get_all_items(self, creds: SpotifyCredentials, path: str, page_size: int) -> list:
+        """
+        All items of a paged collection. The first page reveals `total`;
+        the remaining pages are then fetched in parallel by offset.
+        """
+        first = await self._get(creds, path, {"limit": page_size, "offset": 0})
+        offsets = range(page_size, first.get('total') or 0, page_size)
+        semaphore = asyncio.Semaphore(CONFIG.spotify.page_concurrency)
+
+        async def fetch(offset):
+            async with semaphore:
+                page = await self._get(creds, path, {"limit": page_size, "offset": offset})
+                return page['items']
+
+        # gather keeps pages in offset order
+        pages = await asyncio.gather(*[fetch(offset) for offset in offsets])
+        items = list(first['items'])
+        for page in pages:
+            items.extend(page)
+        return items
+
+    async def get_user_playlists(self, creds: SpotifyCredentials):
+        items = await self._get_all_items(creds, "/me/playlists", 50)
         playlists = []
-        for item in results['items']:
+        for item in items:
+            if not item: continue
             playlists.append({
                 'id': item['id'],
                 'name': item['name'],
@@ -94,39 +201,13 @@ class SpotifyService:
             })
         return playlists
 
-    def get_playlist_tracks(self, access_token, playlist_id):
-        sp = self.get_client(access_token)
-        results = sp.playlist_items(playlist_id)
-        tracks = []
-        for item in results['items']:
-            if not item.get('track'): continue
-            track = item['track']
-            tracks.append(self._format_track(track))
-        
-        # Handle pagination
-        while results['next']:
-            results = sp.next(results)
-            for item in results['items']:
-                if not item.get('track'): continue
-                tracks.append(self._format_track(item['track']))
-                
-        return tracks
-
-    def get_user_saved_tracks(self, access_token):
-        sp = self.get_client(access_token)
-        results = sp.current_user_saved_tracks()
-        tracks = []
-        for item in results['items']:
-            if not item.get('track'): continue
-            tracks.append(self._format_track(item['track']))
-            
-        while results['next']:
-            results = sp.next(results)
-            for item in results['items']:
-                if not item.get('track'): continue
-                tracks.append(self._format_track(item['track']))
-                
-        return tracks
+    async def get_playlist_tracks(self, creds: SpotifyCredentials, playlist_id):
+        items = await self._get_all_items(creds, f"/playlists/{playlist_id}/tracks", 100)
+        return [self._format_track(item['track']) for item in items if item.get('track')]
+
+    async def get_user_saved_tracks(self, creds: SpotifyCredentials):
+        items = await self._get_all_items(creds, "/me/tracks", 50)
+        return [self._format_track(item['track']) for item in items if item.get('track')]
 
     def _format_track(self, track):
         return {
@@ -1,9 +1,18 @@
 import asyncio
 import socket
+import threading
 import time
-from typing import List, Dict
+from typing import AsyncIterator, Dict, Iterator, List, Optional, Tuple
+from urllib.parse import urlparse, parse_qs
+import pytubefix
 from pytubefix import YouTube, Search, Playlist
 from pytubefix.cli import on_progress
+from pytubefix.innertube import InnerTube
+from core.cache import TTLCache, SingleFlight
+from core.config import CONFIG
+from core.executors import stream_pool, search_pool, import_pool, PRIORITY_INTERACTIVE, PRIORITY_BATCH
+from core.persistent_cache import metadata_store
+from services.catalog import track_catalog
 
 # Force IPv4 to avoid YouTube IPv6 blocks on VPS
 def force_ipv4():
@@ -15,77 +24,364 @@ def force_ipv4():
 
 force_ipv4()
 
+def _stream_url_expiry(stream_url: str):
+    """Unix timestamp from the expire= parameter googlevideo embeds in stream URLs."""
+    values = parse_qs(urlparse(stream_url).query).get('expire')
+    try:
+        return int(values[0]) if values else None
+    except ValueError:
+        return None
+
+# googlevideo answers these for a stream URL it no longer accepts (expired, revoked or IP-bound)
+STALE_STREAM_STATUSES = (401, 403, 410)
+
+def normalize_query(query: str) -> str:
+    return " ".join(query.lower().split())
+
+
+def extract_playlist_id(url: str) -> Optional[str]:
+    values = parse_qs(urlparse(url).query).get('list')
+    return values[0] if values else None
+
+
+def _find_key(data, key: str):
+    """First value stored under `key` anywhere in a nested browse response."""
+    stack = [data]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, dict):
+            if key in node:
+                return node[key]
+            stack.extend(reversed(list(node.values())))
+        elif isinstance(node, list):
+            stack.extend(reversed(node))
+    return None
+
+
+def _iter_renderers(data, keys: Tuple[str, ...]):
+    """Yield (key, renderer) for every renderer named in `keys`, in document order."""
+    stack = [data]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, dict):
+            found = next((k for k in keys if k in node), None)
+            if found:
+                yield found, node[found]
+                continue
+            stack.extend(reversed(list(node.values())))
+        elif isinstance(node, list):
+            stack.extend(reversed(node))
+
+
+def _text(value) -> Optional[str]:
+    if not isinstance(value, dict):
+        return None
+    if 'simpleText' in value:
+        return value['simpleText']
+    if value.get('runs'):
+        return "".join(run.get('text', '') for run in value['runs'])
+    return value.get('content')
+
+
+def _parse_duration(text: Optional[str]) -> Optional[int]:
+    try:
+        seconds = 0
+        for part in text.split(":"):
+            seconds = seconds * 60 + int(part)
+        return seconds
+    except (AttributeError, ValueError):
+        return None
+
+
+def _playlist_entry(kind: str, renderer: dict) -> Optional[Dict]:
+    if kind == 'playlistVideoRenderer':
+        # Deleted and private videos stay in the list but cannot be played
+        if not renderer.get('videoId') or renderer.get('isPlayable') is False:
+            return None
+        video_id = renderer['videoId']
+        length = renderer.get('lengthSeconds')
+        return {
+            'id': video_id,
+            'title': _text(renderer.get('title')),
+            'uploader': _text(renderer.get('shortBylineText')),
+            'duration': int(length) if length else _parse_duration(_text(renderer.get('lengthText'))),
+            'thumbnail': f"https://i.ytimg.com/vi/{video_id}/hqdefault.jpg"
+        }
+
+    if renderer.get('contentType') != 'LOCKUP_CONTENT_TYPE_VIDEO' or not renderer.get('contentId'):
+        return None
+    video_id = renderer['contentId']
+    metadata = (renderer.get('metadata') or {}).get('lockupMetadataViewModel') or {}
+    parts = _find_key(metadata.get('metadata'), 'metadataParts') or []
+    badge = _find_key(renderer.get('contentImage'), 'thumbnailBadgeViewModel') or {}
+    return {
+        'id': video_id,
+        'title': _text(metadata.get('title')),
+        'uploader': _text(parts[0].get('text')) if parts else None,
+        'duration': _parse_duration(badge.get('text')),
+        'thumbnail': f"https://i.ytimg.com/vi/{video_id}/hqdefault.jpg"
+    }
+
+
+def _parse_playlist_page(data: dict) -> Tuple[List[Dict], Optional[str]]:
+    """Tracks on one playlist browse page plus the token for the next page, if any."""
+    tracks = []
+    continuation = None
+    for kind, renderer in _iter_renderers(data, ('playlistVideoRenderer', 'lockupViewModel', 'continuationItemRenderer')):
+        if kind == 'continuationItemRenderer':
+            command = _find_key(renderer, 'continuationCommand')
+            if command and command.get('token'):
+                continuation = command['token']
+            continue
+        track = _playlist_entry(kind, renderer)
+        if track:
+            tracks.append(track)
+    return tracks, continuation
+
+
+class SearchSession:
+    """A pytubefix Search plus the results already fetched through its continuations."""
+
+    def __init__(self, query: str):
+        self.search = Search(query)
+        self.results = []
+        # Number of s.videos entries already converted into results
+        self.consumed = 0
+        self.exhausted = False
+        self.lock = threading.Lock()
+
 class YouTubeService:
     def __init__(self):
+        cfg = CONFIG.stream_cache
         # Cache to prevent double-requests (Metadata + Audio Proxy)
-        # video_id -> {'data': dict, 'expires': float}
-        self.stream_cache = {}
+        # video_id -> stream data dict, expiring with the googlevideo URL
+        self.stream_cache = TTLCache(cfg.max_entries, default_ttl=cfg.default_ttl)
+        # Concurrent lookups for one uncached video share a single extraction
+        self.stream_flight = SingleFlight()
+        # video_id -> priority and latest queued pool call of each extraction in flight,
+        # so a player joining a prefetch can move it up the stream queue
+        self.stream_priority: Dict[str, int] = {}
+        self.stream_pending: Dict[str, tuple] = {}
+        # video_id -> {'size': int, 'mime_type': str}
+        # Outlives the stream URL so Range responses can be sized without upstream
+        self.content_info = TTLCache(cfg.content_info_max_entries)
+        # normalized query -> SearchSession, so page N+1 only fetches one continuation
+        self.search_sessions = TTLCache(CONFIG.search_cache.max_sessions, default_ttl=CONFIG.search_cache.session_ttl)
+        self.search_sessions_lock = threading.Lock()
 
     def _get_cached_stream(self, video_id: str):
-        now = time.time()
-        if video_id in self.stream_cache:
-            item = self.stream_cache[video_id]
-            if now < item['expires']:
-                print(f"[DEBUG] Cache HIT for {video_id}")
-                return item['data']
-            else:
-                del self.stream_cache[video_id]
-        return None
+        data = self.stream_cache.get(video_id)
+        if data:
+            print(f"[DEBUG] Cache HIT for {video_id}")
+        return data
+
+    def _stream_expires_at(self, data: dict) -> float:
+        cfg = CONFIG.stream_cache
+        expires = _stream_url_expiry(data['stream_url'])
+        if expires:
+            return expires - cfg.expiry_margin
+        return time.time() + cfg.default_ttl
 
-    def _set_cached_stream(self, video_id: str, data: dict):
-        self.stream_cache[video_id] = {
-            'data': data,
-            'expires': time.time() + 600 # Cache for 10 minutes
+    def _set_cached_stream(self, video_id: str, data: dict, expires_at: float):
+        self.stream_cache.set(video_id, data, expires_at=expires_at)
+
+    def warm_up(self):
+        """Load everything still valid from the persistent store into memory."""
+        metadata_store.purge_expired()
+        streams = metadata_store.iter_streams()
+        for video_id, data, expires_at in streams:
+            self._set_cached_stream(video_id, data, expires_at)
+        for video_id, filesize, mime_type in track_catalog.iter_content_info(self.content_info.maxsize):
+            self.content_info.set(video_id, {'size': filesize, 'mime_type': mime_type})
+
+        # Player JS is what pytubefix downloads to decipher signatures
+        js_url = metadata_store.get_value('player_js_url')
+        if js_url and not pytubefix.__js_url__:
+            pytubefix.__js__ = metadata_store.get_value('player_js')
+            pytubefix.__js_url__ = js_url
+        print(f"[DEBUG] Warmed {len(streams)} stream URLs and {len(self.content_info)} content sizes from {metadata_store.path}")
+
+    def _persist_player_js(self):
+        js_url = pytubefix.__js_url__
+        if js_url and pytubefix.__js__ and js_url != metadata_store.get_value('player_js_url'):
+            metadata_store.put_value('player_js', pytubefix.__js__)
+            metadata_store.put_value('player_js_url', js_url)
+
+    def get_content_info(self, video_id: str):
+        return self.content_info.get(video_id)
+
+    def cache_stats(self) -> dict:
+        return {
+            'stream_url': {**self.stream_cache.stats(), **self.stream_flight.stats()},
+            'content_info': self.content_info.stats(),
+            'search_sessions': self.search_sessions.stats(),
+            'persistent': metadata_store.stats()
         }
 
-    async def search(self, query: str, limit: int = 10, offset: int = 0) -> List[Dict]:
+    async def search(
+        self, query: str, limit: int = 10, offset: int = 0,
+        priority: int = PRIORITY_INTERACTIVE, raise_errors: bool = False
+    ) -> List[Dict]:
+        # Batch lookups (imports) do not page, so they skip the session cache,
+        # and run on the imports pool so they never hold a search thread
+        batch = priority == PRIORITY_BATCH
+        pool = import_pool if batch else search_pool
         try:
             print(f"[DEBUG] Search: {query}")
-            loop = asyncio.get_event_loop()
-            results = await loop.run_in_executor(None, self._search_sync, query, limit, offset)
+            results = await pool.run(self._search_sync, query, limit, offset, not batch, priority=priority)
             return results
         except Exception as e:
             print(f"[ERROR] Search failed: {e}")
+            if raise_errors:
+                raise
             return []
 
-    def _search_sync(self, query: str, limit: int, offset: int):
-        # We use a human search query
-        s = Search(query)
-        results = []
-        # Get videos with slice
-        videos = s.videos[offset:offset + limit]
-        for vid in videos:
-            try:
-                results.append({
-                    'id': vid.video_id,
-                    'title': vid.title,
-                    'uploader': vid.author,
-                    'duration': vid.length,
-                    'thumbnail': vid.thumbnail_url,
-                    'url': vid.watch_url
-                })
-            except Exception:
-                continue
+    def _get_search_session(self, key: str, query: str) -> SearchSession:
+        with self.search_sessions_lock:
+            session = self.search_sessions.get(key)
+            if session is None:
+                session = SearchSession(query)
+                self.search_sessions.set(key, session)
+            return session
+
+    def _search_sync(self, query: str, limit: int, offset: int, keep_session: bool = True):
+        key = normalize_query(query)
+        page_key = f"{key}|{offset}|{limit}"
+        cached = metadata_store.get_search(page_key)
+        if cached is not None:
+            print(f"[DEBUG] Search cache HIT for {query}")
+            return cached
+
+        session = self._get_search_session(key, query) if keep_session else SearchSession(query)
+        wanted = min(offset + limit, CONFIG.search_cache.max_results_per_session)
+        with session.lock:
+            while len(session.results) < wanted and not session.exhausted:
+                # First access fetches page one
+                videos = session.search.videos
+                if session.consumed >= len(videos):
+                    # Everything fetched so far is converted, pull only the next continuation
+                    session.search.get_next_results()
+                    videos = session.search.videos
+                    if len(videos) <= session.consumed:
+                        session.exhausted = True
+                        break
+
+                for vid in videos[session.consumed:]:
+                    session.consumed += 1
+                    try:
+                        session.results.append({
+                            'id': vid.video_id,
+                            'title': vid.title,
+                            'uploader': vid.author,
+                            'duration': vid.length,
+                            'thumbnail': vid.thumbnail_url,
+                            'url': vid.watch_url
+                        })
+                    except Exception:
+                        continue
+                    if len(session.results) >= wanted:
+                        break
+
+            results = session.results[offset:offset + limit]
+
+        if results:
+            metadata_store.put_search(page_key, results, CONFIG.metadata_cache.search_ttl)
+            track_catalog.put(results)
         return results
 
-    async def get_stream_url(self, video_id: str):
+    async def get_stream_url(self, video_id: str, priority: int = PRIORITY_INTERACTIVE):
         # Check Cache First
         cached = self._get_cached_stream(video_id)
-        if cached: return cached
+        if cached: return dict(cached)
+
+        self._promote_stream(video_id, priority)
+        data = await self.stream_flight.do(video_id, lambda: self._resolve_stream(video_id, priority))
+        # Callers may rewrite fields (e.g. stream_url), never hand out the cached dict
+        return dict(data)
+
+    async def invalidate_stream(self, video_id: str):
+        """Forget a stream URL googlevideo rejected, in this worker and in the shared store."""
+        self.stream_cache.pop(video_id)
+        await stream_pool.run(metadata_store.delete_stream, video_id)
+        print(f"[DEBUG] Dropped rejected stream URL for {video_id}")
+
+    def _promote_stream(self, video_id: str, priority: int):
+        """Raise an in-flight extraction to the priority of a more urgent caller."""
+        current = self.stream_priority.get(video_id)
+        if current is None or priority >= current:
+            return
+        self.stream_priority[video_id] = priority
+        pending = self.stream_pending.get(video_id)
+        if pending:
+            future, fn, args = pending
+            stream_pool.promote(future, fn, *args, priority=priority)
+
+    async def _stream_call(self, video_id: str, fn, *args):
+        # Submitted at the extraction's current priority, which a joining caller may raise
+        future = stream_pool.submit(fn, *args, priority=self.stream_priority[video_id])
+        self.stream_pending[video_id] = (future, fn, args)
+        try:
+            return await asyncio.wrap_future(future)
+        finally:
+            self.stream_pending.pop(video_id, None)
+
+    def _use_stored_stream(self, video_id: str, stored: tuple) -> dict:
+        data, expires_at = stored
+        self._set_cached_stream(video_id, data, expires_at)
+        if data.get('filesize'):
+            self.content_info.set(video_id, {'size': data['filesize'], 'mime_type': data['mime_type']})
+        return data
+
+    async def _wait_for_shared_stream(self, video_id: str):
+        """Poll the shared store while another worker extracts `video_id`."""
+        deadline = time.monotonic() + CONFIG.stream_cache.shared_wait
+        while time.monotonic() < deadline:
+            await asyncio.sleep(0.25)
+            stored = await self._stream_call(video_id, metadata_store.get_stream, video_id)
+            if stored:
+                print(f"[DEBUG] Stream for {video_id} resolved by another worker")
+                return self._use_stored_stream(video_id, stored)
+        return None
+
+    async def _resolve_stream(self, video_id: str, priority: int):
+        self.stream_priority[video_id] = priority
+        try:
+            return await self._extract_stream(video_id)
+        finally:
+            self.stream_priority.pop(video_id, None)
+
+    async def _extract_stream(self, video_id: str):
+        stored = await self._stream_call(video_id, metadata_store.get_stream, video_id)
+        if stored:
+            return self._use_stored_stream(video_id, stored)
+
+        # Across worker processes, only the lease holder extracts; the rest wait for its result
+        lease_key = f"stream:{video_id}"
+        leased = await self._stream_call(video_id, metadata_store.acquire_lease, lease_key, CONFIG.stream_cache.shared_wait)
+        if not leased:
+            data = await self._wait_for_shared_stream(video_id)
+            if data:
+                return data
 
         try:
             url = f"https://www.youtube.com/watch?v={video_id}"
-            loop = asyncio.get_event_loop()
             
             # Using client='MWEB' or 'WEB' often helps on VPS
             # but let's try the user's standard request first
-            data = await loop.run_in_executor(None, self._get_audio_url_sync, url)
+            data = await self._stream_call(video_id, self._get_audio_url_sync, url)
             
-            self._set_cached_stream(video_id, data)
+            expires_at = self._stream_expires_at(data)
+            self._set_cached_stream(video_id, data, expires_at)
+            if data.get('filesize'):
+                self.content_info.set(video_id, {'size': data['filesize'], 'mime_type': data['mime_type']})
+            await self._stream_call(video_id, self._persist_stream, video_id, data, expires_at)
             return data
         except Exception as e:
             print(f"[ERROR] Pytubefix extraction failed: {e}")
             raise Exception(f"Failed to get stream: {str(e)}")
+        finally:
+            if leased:
+                await self._stream_call(video_id, metadata_store.release_lease, lease_key)
 
     def _get_audio_url_sync(self, url: str):
         # Default pytubefix logic
@@ -94,35 +390,53 @@ class YouTubeService:
         if not stream:
             raise Exception("No audio stream found")
             
+        self._persist_player_js()
         return {
             'id': yt.video_id,
             'stream_url': stream.url,
             'title': yt.title,
-            'duration': yt.length
+            'uploader': yt.author,
+            'thumbnail': f"https://i.ytimg.com/vi/{yt.video_id}/hqdefault.jpg",
+            'duration': yt.length,
+            'filesize': stream.filesize,
+            'mime_type': stream.mime_type
         }
 
-    async def get_playlist_tracks(self, playlist_url: str) -> List[Dict]:
-        try:
-            loop = asyncio.get_event_loop()
-            return await loop.run_in_executor(None, self._get_playlist_tracks_sync, playlist_url)
-        except Exception as e:
-            print(f"[ERROR] Playlist failed: {e}")
-            return []
+    def _persist_stream(self, video_id: str, data: dict, expires_at: float):
+        metadata_store.put_stream(video_id, data, expires_at)
+        track_catalog.put([{
+            'id': video_id,
+            'title': data.get('title'),
+            'uploader': data.get('uploader'),
+            'thumbnail': data.get('thumbnail'),
+            'duration': data.get('duration'),
+            'filesize': data.get('filesize'),
+            'mime_type': data.get('mime_type')
+        }])
 
-    def _get_playlist_tracks_sync(self, url: str):
-        pl = Playlist(url)
-        results = []
-        for video in pl.videos:
-            try:
-                results.append({
-                    'id': video.video_id,
-                    'title': video.title,
-                    'uploader': video.author,
-                    'duration': video.length,
-                    'thumbnail': video.thumbnail_url
-                })
-            except Exception:
-                continue
-        return results
+    async def iter_playlist_pages(self, playlist_url: str) -> AsyncIterator[List[Dict]]:
+        """
+        Yield a playlist's tracks one continuation page (~100 entries) at a time,
+        so callers can store each page before the next one is fetched.
+        """
+        pages = self._iter_playlist_pages_sync(playlist_url)
+        while True:
+            page = await import_pool.run(next, pages, None, priority=PRIORITY_BATCH)
+            if page is None:
+                return
+            yield page
+
+    def _iter_playlist_pages_sync(self, url: str) -> Iterator[List[Dict]]:
+        # Reads the renderers of each browse page directly instead of building a YouTube object per video
+        data = Playlist(url).initial_data
+        visitor_data = _find_key(data, 'visitorData')
+        innertube = InnerTube('WEB')
+        while data:
+            tracks, continuation = _parse_playlist_page(data)
+            if tracks:
+                yield tracks
+            if not continuation:
+                return
+            data = innertube.browse(continuation=continuation, visitor_data=visitor_data)
 
 youtube_service = YouTubeService()
@@ -0,0 +1,27 @@
+import tempfile
+from pathlib import Path
+import pytest
+from core.config import CONFIG
+
+# Point every store at a scratch directory before the app modules open them
+TMP_DIR = Path(tempfile.mkdtemp(prefix="mobify-tests-"))
+CONFIG.database.url = f"sqlite:///{TMP_DIR / 'mobify.db'}"
+CONFIG.metadata_cache.path = str(TMP_DIR / "cache.db")
+CONFIG.audio_cache.dir = str(TMP_DIR / "audio_cache")
+
+
+@pytest.fixture(scope="session")
+def client():
+    from fastapi.testclient import TestClient
+    import main
+    with TestClient(main.app) as c:
+        yield c
+
+
+@pytest.fixture
+def register(client):
+    """Create a user and return its auth headers."""
+    def _register(username: str) -> dict:
+        res = client.post("/auth/register", json={"username": username, "password": "secret"})
+        return {"Authorization": f"Bearer {res.json()['token']}"}
+    return _register
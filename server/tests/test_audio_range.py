@@ -0,0 +1,38 @@
+import pytest
+from services.audio_cache import parse_range
+
+SIZE = 1000
+
+
+@pytest.mark.parametrize("header, expected", [
+    (None, (0, 999)),
+    ("", (0, 999)),
+    ("bytes=0-99", (0, 99)),
+    ("bytes=0-0", (0, 0)),
+    # Open-ended: to the end of the file
+    ("bytes=500-", (500, 999)),
+    ("bytes=999-", (999, 999)),
+    # Suffix: the last N bytes, the whole file if N exceeds it
+    ("bytes=-100", (900, 999)),
+    ("bytes=-1000", (0, 999)),
+    ("bytes=-5000", (0, 999)),
+    # An end past the file is clamped
+    ("bytes=990-5000", (990, 999)),
+    # Only the first range of a multi-range request is served
+    ("bytes=0-1, 5-6", (0, 1)),
+])
+def test_satisfiable_ranges(header, expected):
+    assert parse_range(header, SIZE) == expected
+
+
+@pytest.mark.parametrize("header", [
+    "bytes=1000-",
+    "bytes=1000-1001",
+    "bytes=5-2",
+    "bytes=-0",
+    "bytes=-",
+    "items=0-1",
+    "bytes=abc",
+])
+def test_unsatisfiable_ranges(header):
+    assert parse_range(header, SIZE) is None
@@ -0,0 +1,116 @@
+import sqlite3
+from sqlalchemy import create_engine, inspect
+from core.config import CONFIG
+from database import Base, SessionLocal, Track, _migrate
+from services.catalog import track_catalog
+
+
+def track(video_id, title, thumbnail="https://i.ytimg.com/vi/x/hqdefault.jpg"):
+    return {"video_id": video_id, "title": title, "uploader": "Artist", "thumbnail": thumbnail, "duration": 200}
+
+
+def test_client_metadata_does_not_overwrite_catalog(client, register):
+    alice = register("catalog-alice")
+    bob = register("catalog-bob")
+    # The video arrives the way a YouTube search result would
+    track_catalog.put([{**track("catalog0001", "Real Title"), "id": "catalog0001"}])
+    client.post("/liked", json=track("catalog0001", "Real Title"), headers=alice)
+
+    client.post("/liked", json=track("catalog0001", "HACKED", "http://evil/x.png"), headers=bob)
+    client.post("/liked/batch", json={"tracks": [track("catalog0001", "HACKED")]}, headers=bob)
+    pid = client.post("/playlists", json={"name": "p"}, headers=bob).json()["id"]
+    client.post(f"/playlists/{pid}/tracks", json=track("catalog0001", "HACKED"), headers=bob)
+    client.post(f"/playlists/{pid}/tracks/batch", json={"tracks": [track("catalog0001", "HACKED")]}, headers=bob)
+
+    liked = client.get("/liked", headers=alice).json()["tracks"]
+    assert [(t["id"], t["title"], t["thumbnail"]) for t in liked] == [
+        ("catalog0001", "Real Title", "https://i.ytimg.com/vi/x/hqdefault.jpg")
+    ]
+    # Bob's rows exist but show the catalog's metadata, not what Bob sent
+    assert client.get("/liked", headers=bob).json()["tracks"][0]["title"] == "Real Title"
+    found = client.get("/search", params={"query": "real title", "source": "local"}).json()["results"]
+    assert [t["id"] for t in found] == ["catalog0001"]
+    assert client.get("/search", params={"query": "hacked", "source": "local"}).json()["results"] == []
+
+    # A video the catalog has never seen keeps the client's metadata, but only as unverified
+    client.post("/liked", json=track("plantedfake", "Totally Legit Song", "http://evil/p.png"), headers=bob)
+    liked = {t["id"]: t for t in client.get("/liked", headers=bob).json()["tracks"]}
+    assert liked["plantedfake"]["title"] == "Totally Legit Song"
+    with SessionLocal() as db:
+        assert db.get(Track, "plantedfake").verified is False
+    assert client.get("/search", params={"query": "legit", "source": "local"}).json()["results"] == []
+    # YouTube data then replaces every field the client supplied
+    track_catalog.put([{"id": "plantedfake", "title": "Actual Song", "uploader": "Channel"}])
+    with SessionLocal() as db:
+        planted = db.get(Track, "plantedfake")
+        assert (planted.verified, planted.title, planted.thumbnail) == (True, "Actual Song", None)
+    found = client.get("/search", params={"query": "actual", "source": "local"}).json()["results"]
+    assert [t["id"] for t in found] == ["plantedfake"]
+
+    assert client.post("/liked", json=track("not-a-video-id", "Bad"), headers=bob).status_code == 422
+
+
+def test_migration_moves_metadata_into_catalog(tmp_path):
+    path = tmp_path / "legacy.db"
+    legacy = sqlite3.connect(path)
+    legacy.executescript("""
+        CREATE TABLE users (id INTEGER PRIMARY KEY, username VARCHAR(255) NOT NULL UNIQUE, password_hash VARCHAR(255) NOT NULL,
+            created_at DATETIME, spotify_access_token TEXT, spotify_refresh_token TEXT, spotify_token_expiry INTEGER);
+        CREATE TABLE playlists (id INTEGER PRIMARY KEY, user_id INTEGER NOT NULL, name VARCHAR(255) NOT NULL, created_at DATETIME);
+        CREATE TABLE liked_songs (id INTEGER PRIMARY KEY, user_id INTEGER NOT NULL, video_id VARCHAR(50) NOT NULL,
+            title VARCHAR(500), uploader VARCHAR(255), thumbnail TEXT, duration INTEGER, added_at DATETIME);
+        CREATE TABLE playlist_tracks (id INTEGER PRIMARY KEY, playlist_id INTEGER NOT NULL, video_id VARCHAR(50) NOT NULL,
+            title VARCHAR(500), uploader VARCHAR(255), thumbnail TEXT, duration INTEGER, position INTEGER, added_at DATETIME);
+        CREATE TABLE track_matches (key VARCHAR(600) PRIMARY KEY, source_duration INTEGER, video_id VARCHAR(50) NOT NULL,
+            title VARCHAR(500), uploader VARCHAR(255), thumbnail TEXT, duration INTEGER, created_at DATETIME);
+        INSERT INTO users VALUES (1, 'u', 'x', NULL, NULL, NULL, NULL);
+        INSERT INTO playlists VALUES (1, 1, 'p', NULL);
+        INSERT INTO liked_songs VALUES (1, 1, 'a', 'A', 'ua', 'ta', 10, NULL), (2, 1, 'b', 'B', 'ub', 'tb', 20, NULL);
+        INSERT INTO playlist_tracks VALUES (1, 1, 'a', 'A', 'ua', 'ta', 10, 0, NULL), (2, 1, 'c', 'C', 'uc', 'tc', 30, 1, NULL);
+        INSERT INTO track_matches VALUES ('spotify:x', 100, 'd', 'D', 'ud', 'td', 40, NULL);
+    """)
+    legacy.commit()
+    legacy.close()
+
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        _migrate(conn)
+    # A second start finds nothing left to move
+    with engine.begin() as conn:
+        _migrate(conn)
+
+    inspector = inspect(engine)
+    for table in ("liked_songs", "playlist_tracks", "track_matches"):
+        columns = {column["name"] for column in inspector.get_columns(table)}
+        assert not columns & {"title", "uploader", "thumbnail", "duration"}
+
+    with engine.connect() as conn:
+        tracks = conn.exec_driver_sql(
+            "SELECT video_id, title, uploader, thumbnail, duration, verified FROM tracks ORDER BY video_id"
+        ).all()
+        library = conn.exec_driver_sql(
+            "SELECT l.user_id, t.title FROM liked_songs l JOIN tracks t ON t.video_id = l.video_id ORDER BY l.id"
+        ).all()
+        playlist = conn.exec_driver_sql(
+            "SELECT p.position, t.title FROM playlist_tracks p JOIN tracks t ON t.video_id = p.video_id ORDER BY p.position"
+        ).all()
+    engine.dispose()
+
+    assert [tuple(row) for row in tracks] == [
+        ("a", "A", "ua", "ta", 10, 0), ("b", "B", "ub", "tb", 20, 0), ("c", "C", "uc", "tc", 30, 0), ("d", "D", "ud", "td", 40, 1)
+    ]
+    assert [tuple(row) for row in library] == [(1, "A"), (1, "B")]
+    assert [tuple(row) for row in playlist] == [(0, "A"), (1, "C")]
+
+
+def test_stats_reports_catalog_size(client, register, monkeypatch):
+    headers = register("catalog-stats")
+    monkeypatch.setattr(CONFIG.auth, "admin_users", ["catalog-stats"])
+    client.post("/liked", json=track("catalogstat", "Counted"), headers=headers)
+    assert client.get("/stats", headers=headers).json()["catalog"]["tracks"] >= 1
+
+
+def test_stats_requires_admin(client, register):
+    assert client.get("/stats").status_code == 401
+    assert client.get("/stats", headers=register("not-an-admin")).status_code == 403
@@ -0,0 +1,33 @@
+import pytest
+from services.lyrics import parse_lrc
+
+
+@pytest.mark.parametrize("stamp", ["[00:01.5]", "[00:01.50]", "[00:01.500]", "[00:01:50]"])
+def test_fraction_digits_all_mean_the_same_time(stamp):
+    assert parse_lrc(f"{stamp}Hello") == [[1500, "Hello"]]
+
+
+def test_timestamp_without_fraction_and_long_minutes():
+    assert parse_lrc("[00:02]Two\n[100:00.25]Late") == [[2000, "Two"], [6000250, "Late"]]
+
+
+def test_line_with_several_timestamps_is_repeated_in_time_order():
+    lrc = "[00:30.00][00:10.00]Chorus\n[00:20.00]Verse"
+    assert parse_lrc(lrc) == [[10000, "Chorus"], [20000, "Verse"], [30000, "Chorus"]]
+
+
+def test_metadata_tags_and_empty_timed_lines_are_skipped():
+    lrc = "[ar:Artist]\n[ti:Title]\n[length:03:20]\n[00:01.00]\n[00:02.00]  Words  \n"
+    assert parse_lrc(lrc) == [[2000, "Words"]]
+
+
+def test_unsynced_lyrics_keep_their_order_without_tags():
+    assert parse_lrc("[ti:Title]\nFirst line\n\nSecond line") == [[None, "First line"], [None, "Second line"]]
+
+
+def test_synced_lines_win_over_plain_text():
+    assert parse_lrc("Intro text\n[00:05.00]Timed") == [[5000, "Timed"]]
+
+
+def test_empty_input():
+    assert parse_lrc("") == []
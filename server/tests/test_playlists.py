@@ -0,0 +1,13 @@
+def track(video_id, title):
+    return {"video_id": video_id, "title": title, "uploader": "Artist", "thumbnail": "", "duration": 200}
+
+
+def test_batch_add_keeps_first_occurrence_order(client, register):
+    headers = register("playlist-order")
+    pid = client.post("/playlists", json={"name": "p"}, headers=headers).json()["id"]
+    batch = [track("playlistAAA", "A first"), track("playlistBBB", "B"), track("playlistAAA", "A again")]
+
+    res = client.post(f"/playlists/{pid}/tracks/batch", json={"tracks": batch}, headers=headers).json()
+    assert res == {"added": 2, "skipped": 0}
+    tracks = client.get(f"/playlists/{pid}", headers=headers).json()["tracks"]
+    assert [(t["id"], t["title"]) for t in tracks] == [("playlistAAA", "A first"), ("playlistBBB", "B")]
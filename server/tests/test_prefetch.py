@@ -0,0 +1,33 @@
+import asyncio
+from core.config import CONFIG
+from services.prefetch import PrefetchService
+
+
+def test_prefetch_requires_auth(client):
+    res = client.post("/prefetch", json={"tracks": [{"video_id": "prefetch001"}]})
+    assert res.status_code in (401, 403)
+
+
+def test_schedule_skips_pending_ids_and_bounds_backlog(monkeypatch):
+    monkeypatch.setattr(CONFIG.prefetch, "max_tracks", 10)
+    monkeypatch.setattr(CONFIG.prefetch, "max_pending", 3)
+
+    async def scenario():
+        release = asyncio.Event()
+        service = PrefetchService()
+
+        async def warm(track, audio):
+            await release.wait()
+        service._warm = warm
+
+        first = service.schedule([{"video_id": "a"}, {"video_id": "b"}])
+        # 'a' is already pending; only one more fits under max_pending
+        second = service.schedule([{"video_id": "a"}, {"video_id": "c"}, {"video_id": "d"}])
+        pending = sorted(service.tasks)
+        release.set()
+        await asyncio.gather(*service.tasks.values())
+        return first, second, pending, service.stats()
+
+    first, second, pending, stats = asyncio.run(scenario())
+    assert (first, second, pending) == (2, 1, ["a", "b", "c"])
+    assert stats == {"scheduled": 3, "dropped": 1, "running": 0}